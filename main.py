@@ -8,6 +8,7 @@
  Added algorithm ADR++ and Event based
 """
 
+import argparse
 import json
 import os
 import numpy as np
@@ -15,22 +16,34 @@ import matplotlib.pyplot as plt
 
 # Import core simulation logic
 from src.lora_simulator import run_simulation, calculate_stats, reset_global_counters, save_results
+from src.lora_sweep import serve_sweep, run_worker, sweep_settings
+from src.lora_param_sweep import run_param_sweep
+from src.lora_trace import replay_trace
+from src.lora_gateway import gateway_from_config
+from src.lora_capacity import capacity_estimator_from_config
+from src.lora_metrics import read_metrics
 
-def run_automated_experiments():
-    """Reads JSON, runs Base and Modified scenarios for all node counts, and plots comparison."""
-    
+def load_experiment_config():
+    """Reads the experiment configuration, or returns None if it cannot be found."""
     CONFIG_FILE = 'config/config.json'
     try:
         with open(CONFIG_FILE, 'r') as f:
-            config = json.load(f)
+            return json.load(f)
     except FileNotFoundError:
         # Try fallback to local path if src path fails
         try:
             with open('config.json', 'r') as f:
-                config = json.load(f)
+                return json.load(f)
         except:
             print(f"Error: config.json not found.")
-            return
+            return None
+
+def run_automated_experiments():
+    """Reads JSON, runs Base and Modified scenarios for all node counts, and plots comparison."""
+    
+    config = load_experiment_config()
+    if config is None:
+        return
     DATA_FILE = 'results/row_data/simulation_results.dat'
     try:
         os.remove(DATA_FILE)
@@ -71,5 +84,82 @@ def run_automated_experiments():
         
     print("\n--- EXPERIMENTS COMPLETED ---")
 
+def run_capacity_estimate(config):
+    """Prints the analytic DER estimate for NODE_SCENARIOS, calibrated on stored results if any."""
+    estimator = capacity_estimator_from_config(config)
+    rmse = estimator.calibrate(config['EXPERIMENT_CONTROL']['OUTPUT_FILENAME'])
+    if rmse is not None:
+        print(f"Calibrated on stored results: load x{estimator.load_scale:.3f}, DER x{estimator.der_scale:.3f}, RMSE {rmse:.4f}")
+
+    node_scenarios = np.array(config['NODE_SCENARIOS'])
+    estimate = estimator.estimate(node_scenarios)
+    interesting = set(estimator.interesting(node_scenarios).tolist())
+    print("nodes | DER    | collision prob. SF7..SF12")
+    for i, nr_nodes in enumerate(node_scenarios):
+        coll = " ".join(f"{p:.3f}" for p in estimate['collision_prob'][i])
+        mark = " *" if nr_nodes in interesting else ""
+        print(f"{nr_nodes:5d} | {estimate['der'][i]:.4f} | {coll}{mark}")
+    print("(* steep DER region, worth simulating)")
+
+def print_status(config):
+    """Prints the live metrics of the jobs reporting to METRICS.DIRECTORY."""
+    jobs = read_metrics(config.get('METRICS', {}).get('DIRECTORY', 'results/metrics'))
+    if not jobs:
+        print("No job metrics found (is METRICS.ENABLED set?)")
+        return
+    print("type       nodes  seed | status   | sim time  | events/s | in flight | DER    | ETA")
+    for job in jobs:
+        eta = f"{job['eta']:.0f}s" if job.get('eta') is not None else "-"
+        print(f"{job['type']:<10} {job['nodes']:5d} {job['seed']:5d} | {job['status']:<8} | "
+              f"{job['sim_time']:9.0f} | {job['events_per_sec']:8.0f} | {job['in_flight']:9d} | "
+              f"{job['der']:.4f} | {eta}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="LoRaWAN CR-ADR simulation experiments")
+    parser.add_argument('--serve', action='store_true', help="serve the sweep jobs to workers")
+    parser.add_argument('--worker', action='store_true', help="run sweep jobs from a sweep server")
+    parser.add_argument('--param-sweep', action='store_true', help="run the PARAM_SWEEP grid on shared topologies")
+    parser.add_argument('--estimate', action='store_true',
+                        help="predict DER for NODE_SCENARIOS with the analytic capacity estimator")
+    parser.add_argument('--replay', metavar='TRACE', default=None,
+                        help="re-evaluate collisions and ACKs of a recorded trace with the current config")
+    parser.add_argument('--status', action='store_true', help="show the live metrics of running jobs")
+    parser.add_argument('--host', default=None, help="sweep server host (default: SWEEP.HOST)")
+    parser.add_argument('--port', type=int, default=None, help="sweep server port (default: SWEEP.PORT)")
+    parser.add_argument('--local-workers', type=int, default=None,
+                        help="worker processes to start next to the sweep server")
+    return parser.parse_args()
+
 if __name__ == '__main__':
-    run_automated_experiments()
\ No newline at end of file
+    args = parse_args()
+
+    if args.status:
+        config = load_experiment_config()
+        if config is not None:
+            print_status(config)
+    elif args.estimate:
+        config = load_experiment_config()
+        if config is not None:
+            run_capacity_estimate(config)
+    elif args.replay:
+        config = load_experiment_config()
+        if config is not None:
+            results = replay_trace(args.replay, config['SIMULATION_PARAMS']['FULL_COLLISION_MODEL'],
+                                   config['EXPERIMENT_CONTROL']['MAX_BS_RECEIVES'], gateway_from_config(config))
+            print(f"Replayed {results['sent']} uplinks ({results['changed']} outcomes changed)")
+            print(f"DER: {results['der']:.4f} | Collisions: {results['collided']} | No ACK: {results['no_ack']}")
+    elif args.param_sweep:
+        config = load_experiment_config()
+        if config is not None:
+            run_param_sweep(config)
+    elif args.serve or args.worker:
+        config = load_experiment_config()
+        if config is not None:
+            settings = sweep_settings(config)
+            if args.serve:
+                serve_sweep(config, host=args.host, port=args.port, local_workers=args.local_workers)
+            else:
+                address = (args.host or settings['HOST'], args.port or settings['PORT'])
+                run_worker(address, settings['AUTHKEY'].encode())
+    else:
+        run_automated_experiments()
\ No newline at end of file
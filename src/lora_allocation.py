@@ -0,0 +1,62 @@
+import numpy as np
+from typing import Sequence, Tuple
+from .lora_config import *
+from .lora_propagation import airtime
+
+class AllocationSolver:
+    """
+    centralized SF and TX power assignment for all nodes at once, in the spirit of EXPLoRa-AT.
+    every node first gets the lowest SF its link supports with margin dB to spare at full power.
+    with balance, the nodes of each channel are then ranked by path loss and split over the SFs
+    so every SF carries the same airtime load (node share of an SF ~ 1/airtime), never going below
+    a node's minimum SF. finally the TX power is lowered in power_step dB steps while the margin allows.
+    """
+    def __init__(self, bandwidths: Sequence[int], payload: int, margin: float = VAR, balance: bool = True,
+                 max_txpow: int = TX_POWER, min_txpow: int = 2, power_step: int = 2):
+        self.bandwidths = np.asarray(bandwidths, dtype=np.int64)  # per channel of the plan
+        self.margin = margin
+        self.balance = balance
+        self.max_txpow = max_txpow
+        self.min_txpow = min_txpow
+        self.power_step = power_step
+
+        sfs = range(7, 13)
+        # sensitivity and airtime per channel and SF
+        bw_index = np.array([[125, 250, 500].index(bw) + 1 for bw in self.bandwidths])
+        self.sensitivity = SENSI[:, bw_index].T.astype(np.float64)
+        self.airtime = np.array([[airtime(sf, CODING_RATE, LORAWAN_HEADER + payload, bw) for sf in sfs]
+                                 for bw in self.bandwidths])
+        # cumulative node share of the SFs that equalises their airtime load
+        share = 1.0 / self.airtime
+        self.boundaries = np.cumsum(share / share.sum(axis=1, keepdims=True), axis=1)[:, :-1]
+
+    def solve(self, path_loss: np.ndarray, channel: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """returns the SF and TX power (dBm) of every node, given its mean path loss and channel index."""
+        path_loss = np.asarray(path_loss, dtype=np.float64)
+        channel = np.asarray(channel, dtype=np.int64)
+        headroom = (self.max_txpow - GL - path_loss)[:, np.newaxis] - self.sensitivity[channel]  # (N, 6)
+
+        feasible = headroom >= self.margin
+        sf = np.where(feasible.any(axis=1), np.argmax(feasible, axis=1), 5)
+
+        if self.balance and len(sf):
+            # rank of each node within its channel, closest first
+            order = np.lexsort((path_loss, channel))
+            counts = np.bincount(channel, minlength=len(self.bandwidths))
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            rank = np.empty(len(sf), dtype=np.float64)
+            rank[order] = np.arange(len(sf)) - starts[channel[order]]
+            position = (rank + 0.5) / counts[channel]
+            target = (position[:, np.newaxis] > self.boundaries[channel]).sum(axis=1)
+            sf = np.maximum(sf, target)
+
+        excess = headroom[np.arange(len(sf)), sf] - self.margin
+        reduction = np.maximum(np.floor(excess / self.power_step), 0) * self.power_step
+        txpow = np.clip(self.max_txpow - reduction, self.min_txpow, self.max_txpow).astype(np.int64)
+        return sf + 7, txpow
+
+def allocation_solver_from_config(config: dict, bandwidths: Sequence[int]) -> AllocationSolver:
+    """solver for the CENTRALIZED ADR policy, tuned by the optional CR_ADR.MARGIN and CR_ADR.BALANCE_LOAD."""
+    adr_config = config['CR_ADR']
+    return AllocationSolver(bandwidths, PCKT_LENGTH_SF[0], adr_config.get('MARGIN', VAR),
+                            adr_config.get('BALANCE_LOAD', True))
@@ -0,0 +1,206 @@
+import math
+import numpy as np
+from scipy.stats import norm
+from typing import Dict, Optional, Sequence
+from .lora_config import *
+from .lora_propagation import per, airtime
+from .lora_topology import network_geometry
+from .lora_channels import channel_plan_from_config
+
+class CapacityEstimator:
+    """
+    closed-form/numerical pre-screen of a network before running the discrete-event simulation.
+    nodes are uniform over the cell (the radial placement of myNode) and get the SF of assignParameters;
+    each device sends its data_size buffer in payload-sized uplinks plus retransmissions from the start of the run.
+    uplinks are ALOHA on each channel with capture and inter-SF rejection (ISO_THRESHOLDS),
+    the demodulator limit is an Erlang loss system and RX1/RX2 acks are single-server loss systems.
+    channels are treated as equal, non-overlapping and BANDWIDTH wide.
+    load_scale (extra load) and der_scale can be calibrated on stored results.
+    """
+    def __init__(self, avg_send_time: float, full_collision: int = 2, max_bs_receives: int = MAX_BS_RECEIVES,
+                 nr_channels: int = len(FREQUENCIES), grid_points: int = 200, sim_time: float = 100000.0,
+                 data_size: float = 32.0, payload: int = PCKT_LENGTH_SF[0], max_retrans: int = 8):
+        self.avg_send_time = avg_send_time  # seconds, as SIMULATION_PARAMS.AVG_SEND_TIME
+        self.full_collision = full_collision
+        self.max_bs_receives = max_bs_receives
+        self.nr_channels = nr_channels
+        self.sim_time = sim_time
+        self.max_retrans = max_retrans
+        self.load_scale = 1.0
+        self.der_scale = 1.0
+
+        # data uplinks per device: the buffer drains payload bytes per uplink, at most one per send interval
+        self.data_uplinks = min(math.ceil(data_size / payload), sim_time / avg_send_time)
+
+        max_dist, _, _ = network_geometry()
+        bw_index = [125, 250, 500].index(BANDWIDTH) + 1
+        sfs = np.arange(7, 13)
+
+        # radial grid: r = u * max_dist with density 2u (uniform over the disc)
+        u = (np.arange(grid_points) + 0.5) / grid_points
+        self.weight = 2 * u / grid_points
+        path_loss = LPLD0 + 10 * GAMMA * np.log10(u * max_dist / D0)
+        self.rssi = TX_POWER - GL - path_loss
+
+        feasible = SENSI[:, bw_index][np.newaxis, :] < self.rssi[:, np.newaxis]
+        self.sf = np.where(feasible.any(axis=1), np.argmax(feasible, axis=1) + 7, 12)
+        sensitivity = SENSI[self.sf - 7, bw_index]
+        sigma = max(VAR, 1e-9)
+
+        self.airtime = np.array([airtime(sf, CODING_RATE, LORAWAN_HEADER + PCKT_LENGTH_SF[sf - 7], BANDWIDTH) for sf in sfs])
+        self.fraction = np.array([self.weight[self.sf == sf].sum() for sf in sfs])
+
+        # link loss, packet error and downlink loss at each radius
+        p_lost = norm.sf((self.rssi - sensitivity) / sigma)
+        p_error = np.array([per(int(sf), BANDWIDTH, CODING_RATE, float(r), LORAWAN_HEADER + PCKT_LENGTH_SF[sf - 7])
+                            for sf, r in zip(self.sf, self.rssi)])
+        self.p_ok = (1 - p_lost) * (1 - p_error)
+        self.p_dropped = (1 - p_lost) * p_error  # packet errors are not retransmitted
+        self.p_dl_lost = norm.sf((TX_POWER - path_loss - sensitivity) / sigma)
+
+        # interference kernel H[u, v]: harmful overlap per channel of one uplink from radius v with a packet at u
+        diff = self.rssi[:, np.newaxis] - self.rssi[np.newaxis, :]  # self - interferer
+        sf_index = self.sf - 7
+        if full_collision in (1, 2):
+            threshold = ISO_THRESHOLDS[sf_index[:, np.newaxis], sf_index[np.newaxis, :]]
+            harmful = norm.cdf((threshold - diff) / (math.sqrt(2) * sigma))
+        else:
+            harmful = (self.sf[:, np.newaxis] == self.sf[np.newaxis, :]).astype(np.float64)
+        overlap = self.airtime[sf_index][:, np.newaxis] + self.airtime[sf_index][np.newaxis, :]
+        self.kernel = harmful * overlap * (self.weight * self.p_ok)[np.newaxis, :] / self.nr_channels  # (M, M)
+
+        self.ack_airtime = np.array([airtime(sf, 1, ACK_MESS_LEN + LORAWAN_HEADER, BANDWIDTH) for sf in sfs])
+        self.ack_airtime_rx2 = airtime(RX2_SF, 1, ACK_MESS_LEN + LORAWAN_HEADER, BANDWIDTH)
+
+        # mean back-off before a retransmission, as in transmit()
+        self.retrans_delay = np.maximum(2.0 + airtime(12, CODING_RATE, ACK_MESS_LEN + LORAWAN_HEADER, BANDWIDTH),
+                                        self.airtime[sf_index] * ((1 - 0.01) / 0.01)) + 2000.0
+
+    def _uplinks(self, success: np.ndarray) -> np.ndarray:
+        """
+        uplinks per device for a per-attempt success probability, as transmit() sends them:
+        every data uplink but the last is retried up to max_retrans times, the last one ends the buffer.
+        """
+        fail = np.clip(1 - success - self.p_dropped, 0.0, 1.0)
+        attempts = sum(fail**k for k in range(self.max_retrans + 1))
+        return (self.data_uplinks - 1) * attempts + 1
+
+    def _rate(self, uplinks: np.ndarray) -> np.ndarray:
+        """
+        uplinks per second and device while the network is active: all devices start together,
+        so their uplinks are spread over the mean time a device needs to send them (send intervals
+        and retransmission back-offs), at most sim_time.
+        """
+        active = self.data_uplinks * self.avg_send_time + (uplinks - self.data_uplinks) * self.retrans_delay
+        window = np.minimum(active, self.sim_time) @ self.weight
+        return uplinks / window[:, np.newaxis]
+
+    def _received(self, n: np.ndarray, rate: np.ndarray):
+        """per-attempt reception (K, M) and ack probability (K,) for n devices sending rate uplinks/s at each radius."""
+        sf_index = self.sf - 7
+        no_collision = np.exp(-n * (rate @ self.kernel.T))  # (K, M)
+
+        # demodulator limit: Erlang B with max_bs_receives servers
+        erlangs = n[:, 0] * (rate @ (self.weight * self.p_ok * self.airtime[sf_index]))
+        blocked = np.ones_like(erlangs)
+        for m in range(1, self.max_bs_receives + 1):
+            blocked = erlangs * blocked / (m + erlangs * blocked)
+
+        received = self.p_ok * (1 - blocked)[:, np.newaxis] * no_collision
+
+        # acks: RX1 per channel at the uplink SF, overflow to the shared RX2 channel
+        answered = received * rate * self.weight  # acks per second and device at each radius
+        ack_rate = n[:, 0] * answered.sum(axis=1) / self.nr_channels
+        hold_rx1 = answered @ (self.ack_airtime[sf_index] / RX1_DUTY_CYCLE) / np.maximum(answered.sum(axis=1), 1e-12)
+        rho1 = ack_rate * hold_rx1
+        busy_rx1 = rho1 / (1 + rho1)
+        rho2 = self.nr_channels * ack_rate * busy_rx1 * self.ack_airtime_rx2 / RX2_DUTY_CYCLE
+        busy_rx2 = rho2 / (1 + rho2)
+        return no_collision, received, 1 - busy_rx1 * busy_rx2
+
+    def estimate(self, node_counts: Sequence[int], iterations: int = 30) -> Dict[str, np.ndarray]:
+        """
+        predicts, for every node count at once:
+        offered_load (per SF and channel, Erlang), collision_prob (per SF) and der.
+        the retransmissions depend on the success probability and the other way round,
+        so the uplink rate per device is found by fixed-point iteration.
+        """
+        n = np.asarray(node_counts, dtype=np.float64)[:, np.newaxis] * self.load_scale  # (K, 1)
+        sf_index = self.sf - 7
+
+        uplinks = np.full((len(n), len(self.weight)), float(self.data_uplinks))
+        for _ in range(iterations):
+            rate = self._rate(uplinks)
+            no_collision, received, acked = self._received(n, rate)
+            success = received * (1 - self.p_dl_lost) * acked[:, np.newaxis]
+            uplinks = 0.5 * uplinks + 0.5 * self._uplinks(success)
+
+        rate = self._rate(uplinks)
+        no_collision, received, acked = self._received(n, rate)
+        success = received * (1 - self.p_dl_lost) * acked[:, np.newaxis]
+
+        # DER over all uplinks sent: devices that retry more weigh more
+        sent = uplinks * self.weight
+        der = self.der_scale * np.sum(success * sent, axis=1) / sent.sum(axis=1)
+
+        offered_load = np.zeros((len(n), 6))
+        collision_prob = np.zeros((len(n), 6))
+        for s in range(6):
+            mine = sf_index == s
+            if self.fraction[s] > 0:
+                offered_load[:, s] = n[:, 0] * (rate[:, mine] @ self.weight[mine]) * self.airtime[s] / self.nr_channels
+                collision_prob[:, s] = 1 - (no_collision[:, mine] @ self.weight[mine]) / self.fraction[s]
+
+        return {'offered_load': offered_load, 'collision_prob': collision_prob, 'der': der}
+
+    def calibrate(self, fname: str, scenario_type: str = 'BASE') -> Optional[float]:
+        """
+        fits load_scale and der_scale to the DER2 of stored simulation results (same send interval).
+        returns the RMS error of the fit, or None if there is nothing to fit.
+        """
+        nodes, der = [], []
+        try:
+            with open(fname, 'r') as f:
+                for line in f:
+                    if line.startswith('#') or not line.strip():
+                        continue
+                    cols = [c.strip() for c in line.split(',')]
+                    if cols[17] == scenario_type and float(cols[3]) == self.avg_send_time:
+                        nodes.append(int(cols[2]))
+                        der.append(float(cols[13]))
+        except FileNotFoundError:
+            return None
+        if not nodes:
+            return None
+
+        nodes, der = np.array(nodes), np.array(der)
+        best = (np.inf, 1.0, 1.0)
+        self.der_scale = 1.0
+        for load_scale in np.geomspace(0.01, 10.0, 121):
+            self.load_scale = load_scale
+            predicted = self.estimate(nodes)['der']
+            der_scale = (predicted @ der) / max(predicted @ predicted, 1e-12)
+            sse = np.sum((der_scale * predicted - der)**2)
+            if sse < best[0]:
+                best = (sse, load_scale, der_scale)
+
+        _, self.load_scale, self.der_scale = best
+        return math.sqrt(best[0] / len(nodes))
+
+    def interesting(self, node_counts: Sequence[int], min_change: float = 0.02) -> np.ndarray:
+        """returns the node counts where DER changes by at least min_change from a neighbouring count."""
+        node_counts = np.asarray(node_counts)
+        if len(node_counts) < 2:
+            return node_counts
+        change = np.abs(np.diff(self.estimate(node_counts)['der'])) >= min_change
+        marked = np.zeros(len(node_counts), dtype=bool)
+        marked[:-1] |= change
+        marked[1:] |= change
+        return node_counts[marked]
+
+def capacity_estimator_from_config(config: dict) -> CapacityEstimator:
+    sim_params = config['SIMULATION_PARAMS']
+    exp_ctrl = config['EXPERIMENT_CONTROL']
+    return CapacityEstimator(sim_params['AVG_SEND_TIME'], sim_params['FULL_COLLISION_MODEL'],
+                             exp_ctrl['MAX_BS_RECEIVES'], channel_plan_from_config(config).nr_channels,
+                             sim_time=exp_ctrl['SIMULATION_TIME'], data_size=sim_params['DATA_SIZE'])
@@ -0,0 +1,94 @@
+import numpy as np
+from typing import Callable, Dict, List, Optional, Sequence
+from .lora_config import FREQUENCIES, BANDWIDTH
+
+class ChannelPlan:
+    """
+    uplink channel plan: channel frequencies (Hz) and bandwidths (kHz), indexed by a small integer.
+    packets carry the channel index and every overlap decision is a lookup in a precomputed matrix.
+    rx1_channels maps each uplink channel to the downlink channel used for its RX1 window.
+    """
+    def __init__(self, name: str, frequencies: Sequence[int], bandwidths: Sequence[int],
+                 rx1_channels: Optional[Sequence[int]] = None):
+        if len(frequencies) == 0 or len(frequencies) != len(bandwidths):
+            raise ValueError(f"channel plan '{name}' needs one bandwidth per frequency")
+        if len(frequencies) > 255:
+            raise ValueError(f"channel plan '{name}' has more than 255 channels")
+        for bw in bandwidths:
+            if bw not in (125, 250, 500):
+                raise ValueError(f"channel plan '{name}' has an unsupported bandwidth {bw} kHz")
+        self.name = name
+        self.frequencies: List[int] = [int(f) for f in frequencies]
+        self.bandwidths: List[int] = [int(bw) for bw in bandwidths]
+        self.nr_channels = len(self.frequencies)
+        self.rx1_channels: List[int] = list(range(self.nr_channels)) if rx1_channels is None else [int(c) for c in rx1_channels]
+        if len(self.rx1_channels) != self.nr_channels:
+            raise ValueError(f"channel plan '{name}' needs one RX1 channel per uplink channel")
+        self.nr_rx1_channels = max(self.rx1_channels) + 1
+
+        self.overlap = channel_overlap(self.frequencies, self.bandwidths)
+        self.overlap_rows: List[List[bool]] = self.overlap.tolist()  # faster than the array for scalar lookups
+
+    def fingerprint(self) -> tuple:
+        """everything the channel assignment depends on, for cache keys."""
+        return (self.frequencies, self.bandwidths)
+
+    def to_config(self) -> dict:
+        """the CHANNEL_PLAN section that rebuilds this plan."""
+        return {'NAME': 'CUSTOM', 'FREQUENCIES': self.frequencies, 'BANDWIDTHS': self.bandwidths,
+                'RX1_CHANNELS': self.rx1_channels}
+
+def channel_overlap(frequencies: Sequence[int], bandwidths: Sequence[int]) -> np.ndarray:
+    """
+    boolean matrix of the channel pairs that interfere: closer than 120 kHz if either side
+    is 500 kHz wide, 60 kHz if either is 250 kHz and 30 kHz otherwise.
+    """
+    freq = np.asarray(frequencies, dtype=np.int64)
+    bw = np.asarray(bandwidths, dtype=np.int64)
+    diff = np.abs(freq[:, np.newaxis] - freq[np.newaxis, :])
+    widest = np.maximum(bw[:, np.newaxis], bw[np.newaxis, :])
+    threshold = np.select([widest == 500, widest == 250], [120000, 60000], 30000)
+    return diff <= threshold
+
+def legacy_plan() -> ChannelPlan:
+    """the three channels of the original simulator."""
+    return ChannelPlan('LEGACY', FREQUENCIES, [BANDWIDTH] * len(FREQUENCIES))
+
+def eu868_plan() -> ChannelPlan:
+    """EU863-870: the three default channels plus the five usual 867 MHz channels, 125 kHz."""
+    frequencies = [868100000, 868300000, 868500000] + [867100000 + 200000 * i for i in range(5)]
+    return ChannelPlan('EU868', frequencies, [125] * len(frequencies))
+
+def us915_plan() -> ChannelPlan:
+    """US902-928: 64 x 125 kHz and 8 x 500 kHz uplink channels, RX1 on the 8 downlink channels."""
+    frequencies = [902300000 + 200000 * i for i in range(64)] + [903000000 + 1600000 * i for i in range(8)]
+    bandwidths = [125] * 64 + [500] * 8
+    return ChannelPlan('US915', frequencies, bandwidths, rx1_channels=[i % 8 for i in range(72)])
+
+CHANNEL_PLANS: Dict[str, Callable[[], ChannelPlan]] = {
+    'LEGACY': legacy_plan,
+    'EU868': eu868_plan,
+    'US915': us915_plan,
+}
+
+# plan used by the nodes, the collision checks and the gateway of the current run
+ACTIVE_PLAN = legacy_plan()
+
+def get_channel_plan() -> ChannelPlan:
+    return ACTIVE_PLAN
+
+def set_channel_plan(plan: ChannelPlan):
+    global ACTIVE_PLAN
+    ACTIVE_PLAN = plan
+
+def channel_plan_from_config(config: dict) -> ChannelPlan:
+    """builds the plan described by the optional CHANNEL_PLAN section (LEGACY by default)."""
+    settings = config.get('CHANNEL_PLAN', {})
+    name = settings.get('NAME', 'LEGACY')
+    if name == 'CUSTOM':
+        frequencies = settings['FREQUENCIES']
+        bandwidths = settings.get('BANDWIDTHS', [BANDWIDTH] * len(frequencies))
+        return ChannelPlan(name, frequencies, bandwidths, settings.get('RX1_CHANNELS'))
+    if name not in CHANNEL_PLANS:
+        raise ValueError(f"unknown channel plan '{name}', expected CUSTOM or one of {tuple(CHANNEL_PLANS)}")
+    return CHANNEL_PLANS[name]()
@@ -1,27 +1,18 @@
 import math
-from typing import List, Tuple, TYPE_CHECKING
-from .lora_config import ISO_THRESHOLDS, BANDWIDTH, LORAWAN_HEADER, ACK_MESS_LEN
+import numpy as np
+import simpy
+from typing import List, Optional, Tuple, TYPE_CHECKING
+from .lora_config import ISO_THRESHOLDS, CODING_RATE, LORAWAN_HEADER, PCKT_LENGTH_SF
 from .lora_propagation import airtime
+from . import lora_channels
 
 # type hinting setup
 if TYPE_CHECKING:
     from .lora_node import myPacket, myNode # avoid circular imports at runtime
 
 def frequency_collision(p1: 'myPacket', p2: 'myPacket') -> bool:
-    """checks for frequency collision based on BW."""
-    freq_diff = abs(p1.freq - p2.freq)
-    
-    if (freq_diff <= 120000 and (p1.bw == 500 or p2.bw == 500)):
-        # print("frequency coll 500")
-        return True
-    elif (freq_diff <= 60000 and (p1.bw == 250 or p2.bw == 250)):
-        # print("frequency coll 250")
-        return True
-    elif (freq_diff <= 30000): # Assuming 125kHz is the remaining case
-        # print("frequency coll 125")
-        return True
-    
-    return False
+    """checks for frequency collision in the precomputed overlap matrix of the active channel plan."""
+    return lora_channels.ACTIVE_PLAN.overlap_rows[p1.channel][p2.channel]
 
 def timing_collision(p1: 'myPacket', p2: 'myPacket', env_now: float) -> bool:
     """checks for timing collision based on preamble overlap."""
@@ -83,9 +74,10 @@ def power_collision_2(p1: 'myPacket', p2: 'myPacket') -> Tuple['myPacket', ...]:
     return tuple(casualties)
 
 def check_collision(packet: 'myPacket', packets_at_bs: List['myNode'], 
-                    max_bs_receives: int, full_collision: int) -> int:
+                    max_bs_receives: int, full_collision: int, env_now: Optional[float] = None) -> int:
     """
     checks if a newly arrived packet collides with any packet already at the BS.
+    env_now is the arrival time of the packet (the current simulation time by default).
     returns 1 if the 'packet' is a casualty, 0 otherwise.
     """
     col = 0
@@ -105,7 +97,8 @@ def check_collision(packet: 'myPacket', packets_at_bs: List['myNode'],
         other_packet = other_node.packet
         if other_packet.nodeid != packet.nodeid:
             
-            if frequency_collision(packet, other_packet) and timing_collision(packet, other_packet, other_node.env.now):
+            arrival = other_node.env.now if env_now is None else env_now
+            if frequency_collision(packet, other_packet) and timing_collision(packet, other_packet, arrival):
                 
                 # check who collides in the power domain
                 if full_collision == 1:
@@ -128,54 +121,111 @@ def check_collision(packet: 'myPacket', packets_at_bs: List['myNode'],
                         
     return col
 
-def check_ack(packet: 'myPacket', env_now: float, node: 'myNode', 
-              nearst_ack_1p: List[float], nearst_ack_10p: float) -> Tuple[bool, float, List[float], float]:
+def resolve_batch(arrivals: List['myNode'], packets_at_bs: List['myNode'],
+                  max_bs_receives: int, full_collision: int):
     """
-    checks if the gateway can ack this packet based on duty cycle.
-    returns: (acked, ack_airtime, updated_nearst_ack_1p, updated_nearst_ack_10p)
+    resolves a batch of arrivals (in arrival order) against the packets at the BS and against each
+    other in one vectorized step. the outcome is the one of calling check_collision for every arrival
+    in turn at its own arrival time; the arrivals are then appended to packets_at_bs.
     """
+    # columns: packets at the BS, then the arrivals
+    others = [n.packet for n in packets_at_bs] + [n.packet for n in arrivals]
+    nr_existing, nr_others = len(packets_at_bs), len(others)
+    channel = np.fromiter((p.channel for p in others), dtype=np.intp, count=nr_others)
+    sf = np.fromiter((p.sf for p in others), dtype=np.intp, count=nr_others)
+    bw = np.fromiter((p.bw for p in others), dtype=np.float64, count=nr_others)
+    rssi = np.fromiter((p.rssi for p in others), dtype=np.float64, count=nr_others)
+    start = np.fromiter((p.addTime for p in others), dtype=np.float64, count=nr_others)
+    end = start + np.fromiter((p.rectime for p in others), dtype=np.float64, count=nr_others)
+    nodeid = np.fromiter((p.nodeid for p in others), dtype=np.int64, count=nr_others)
 
-    updated_1p = list(nearst_ack_1p)
-    updated_10p = nearst_ack_10p
-    
-    # channel frequencies (assuming the same as the original)
-    FREQUENCIES = [872000000, 864000000, 860000000]
-
-    # 1. check ACK in the first window (1 sec after reception)
-    try:
-        chanl_index = FREQUENCIES.index(packet.freq)
-    except ValueError:
-        # if the packet frequency is not one of the 3 channels, assume it can't be acked on the 1% channels
-        chanl_index = -1 
-        
-    ack_airtime = 0.0
-    
-    if chanl_index != -1:
-        time_of_acking_1 = env_now + 1.0 
-        
-        if time_of_acking_1 >= updated_1p[chanl_index]:
-            # this packet can be acked in the first window
-            ack_airtime = airtime(packet.sf, 1, ACK_MESS_LEN + LORAWAN_HEADER, BANDWIDTH)
-            updated_1p[chanl_index] = time_of_acking_1 + (ack_airtime / 0.01)
-            node.rxtime += ack_airtime
-            return True, ack_airtime, updated_1p, updated_10p
+    # demodulator limit, in arrival order: arrivals beyond the free demodulators are dropped
+    processing = sum(1 for p in others[:nr_existing] if p.processed == 1)
+    free = max(max_bs_receives - processing, 0)
+    for i, p in enumerate(others[nr_existing:]):
+        if i < free:
+            p.processed = 1
         else:
-            # ACK not possible in first window (must listen for preamble)
-            Tsym = (2**packet.sf) / (BANDWIDTH * 1000.0) # seconds
-            Tpream = (8 + 4.25) * Tsym
-            node.rxtime += Tpream
+            p.processed = 0
+            p.collided = 1
+    packets_at_bs.extend(arrivals)
 
-    # 2. check ACK in the second window (2 sec after reception, SF12, 10% duty cycle)
-    time_of_acking_2 = env_now + 2.0 
-    
-    if time_of_acking_2 >= updated_10p:
-        # this packet can be acked in the second window
-        ack_airtime = airtime(12, 1, ACK_MESS_LEN + LORAWAN_HEADER, BANDWIDTH)
-        updated_10p = time_of_acking_2 + (ack_airtime / 0.1)
-        node.rxtime += ack_airtime
-        return True, ack_airtime, updated_1p, updated_10p
+    rows = np.arange(nr_existing, nr_existing + min(free, len(arrivals)))
+    if rows.size == 0 or nr_others == 1:
+        return
+
+    # each arrival only meets the packets that were at the BS before it, and only on overlapping channels
+    # with the end of its preamble critical section (5 of the 8 symbols) before their end
+    Tpreamb = (8 - 5) * (2.0**sf[rows]) / (bw[rows] * 1000.0)
+    hit = (np.arange(nr_others)[np.newaxis, :] < rows[:, np.newaxis]) \
+        & lora_channels.ACTIVE_PLAN.overlap[channel[rows][:, np.newaxis], channel[np.newaxis, :]] \
+        & ((start[rows] + Tpreamb)[:, np.newaxis] < end[np.newaxis, :]) \
+        & (nodeid[rows][:, np.newaxis] != nodeid[np.newaxis, :])
+    if not hit.any():
+        return
+
+    same_sf = sf[rows][:, np.newaxis] == sf[np.newaxis, :]
+    if full_collision in (1, 2):
+        # power_collision_2: capture within the same SF, imperfect orthogonality between SFs
+        diff = rssi[rows][:, np.newaxis] - rssi[np.newaxis, :]
+        threshold_new = ISO_THRESHOLDS[sf[rows][:, np.newaxis] - 7, sf[np.newaxis, :] - 7]
+        threshold_other = ISO_THRESHOLDS[sf[np.newaxis, :] - 7, sf[rows][:, np.newaxis] - 7]
+        new_lost = np.where(same_sf, diff < threshold_new, diff <= threshold_new)
+        other_lost = np.where(same_sf, diff > -threshold_new, -diff <= threshold_other)
     else:
-        Tsym = (2.0**12) / (BANDWIDTH * 1000.0)
-        Tpream = (8 + 4.25) * Tsym
-        node.rxtime += Tpream
-        return False, 0.0, updated_1p, updated_10p
\ No newline at end of file
+        new_lost = other_lost = same_sf
+
+    for i in rows[(hit & new_lost).any(axis=1)]:
+        others[i].collided = 1
+    for i in np.flatnonzero((hit & other_lost).any(axis=0)):
+        others[i].collided = 1
+
+class ArrivalBatcher:
+    """
+    collects the uplinks that reach the BS within window seconds of the first one and resolves them
+    together with resolve_batch. packets that leave the BS inside the window are not seen by the
+    batch, so a window of zero (no batching) is the exact model.
+    """
+    def __init__(self, env: simpy.Environment, packets_at_bs: List['myNode'],
+                 max_bs_receives: int, full_collision: int, window: float, min_vectorized: int = 4):
+        shortest = airtime(7, CODING_RATE, LORAWAN_HEADER + min(PCKT_LENGTH_SF), 500)
+        if not 0.0 < window < shortest:
+            raise ValueError(f"arrival batch window must be in (0, {shortest:.4f}) s, got {window}")
+        self.env = env
+        self.packets_at_bs = packets_at_bs
+        self.max_bs_receives = max_bs_receives
+        self.full_collision = full_collision
+        self.window = window
+        self.min_vectorized = min_vectorized
+        self.pending: List['myNode'] = []
+        self.nr_batches = 0
+        self.nr_arrivals = 0
+
+    def add(self, node: 'myNode'):
+        """queues an uplink that passed the link budget and PER checks."""
+        if not self.pending:
+            self.env.timeout(self.window).callbacks.append(self._flush)
+        self.pending.append(node)
+
+    def _flush(self, _):
+        arrivals, self.pending = self.pending, []
+        self.nr_batches += 1
+        self.nr_arrivals += len(arrivals)
+        if len(arrivals) < self.min_vectorized:
+            # small batches are cheaper one by one (same outcome)
+            for node in arrivals:
+                if check_collision(node.packet, self.packets_at_bs, self.max_bs_receives, self.full_collision,
+                                   env_now=node.packet.addTime) == 1:
+                    node.packet.collided = 1
+                self.packets_at_bs.append(node)
+        else:
+            resolve_batch(arrivals, self.packets_at_bs, self.max_bs_receives, self.full_collision)
+
+def arrival_batcher_from_config(config: dict, env: simpy.Environment,
+                                packets_at_bs: List['myNode']) -> Optional[ArrivalBatcher]:
+    """returns the batcher for EXPERIMENT_CONTROL.ARRIVAL_BATCH_WINDOW, or None when it is zero."""
+    window = config['EXPERIMENT_CONTROL'].get('ARRIVAL_BATCH_WINDOW', 0.0)
+    if window <= 0.0:
+        return None
+    return ArrivalBatcher(env, packets_at_bs, config['EXPERIMENT_CONTROL']['MAX_BS_RECEIVES'],
+                          config['SIMULATION_PARAMS']['FULL_COLLISION_MODEL'], window)
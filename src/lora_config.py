@@ -43,15 +43,24 @@ GL = 0.0
 # TX consumption from -2 to +17 dBm (index 0 is -2 dBm, 19 is +17 dBm)
 TX_MA = [22, 22, 22, 23, 24, 24, 24, 25, 25, 25, 25, 26, 31, 32, 34, 35, 44, 82, 85, 90] 
 RX_MA = 16
+IDLE_MA = 1.6  # standby, waiting for the receive windows
+SLEEP_MA = 0.0001  # 0.1 uA
 VOLTAGE = 3.0  # V
 
 # --- Simulation Parameters (Initializable in main) ---
 MAX_BS_RECEIVES = 8 # Maximum number of packets the BS can receive at the same time
 
-# ACK Duty Cycle Logic
-# nearstACK1p = [0, 0, 0]  # 3 channels with 1% duty cycle
-# nearstACK10p = 0  # one channel with 10% duty cycle
-# FREQUENCIES = [872000000, 864000000, 860000000]
+# Uplink channels (Hz)
+FREQUENCIES = [872000000, 864000000, 860000000]
+
+# Downlink (Class A receive windows)
+RX1_DELAY = 1.0  # s after the end of the uplink, same channel and SF
+RX2_DELAY = 2.0  # s after the end of the uplink, dedicated channel
+RX2_SF = 12
+RX1_DUTY_CYCLE = 0.01  # 1% on each uplink channel
+RX2_DUTY_CYCLE = 0.1  # 10% on the RX2 channel
+FOPTS_MAX_LEN = 15  # Bytes of MAC commands piggybacked in one downlink
+LINK_ADR_REQ_LEN = 5  # Bytes of a LinkADRReq MAC command
 
 # ADR++ Related (for future implementation of the actual ADR++ logic)
 # EFFICIENCY_CONTROLLER_A = ...
\ No newline at end of file
@@ -0,0 +1,155 @@
+import heapq
+import itertools
+from typing import Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+from .lora_config import *
+from .lora_propagation import airtime
+from .lora_channels import ChannelPlan, get_channel_plan, channel_plan_from_config
+
+if TYPE_CHECKING:
+    from .lora_node import myPacket, myNode
+
+# MAC command priorities (lower is served first); the ACK itself is a header flag and always sent
+ADR_PRIORITY = 1
+
+RX_POLICIES = ('RX1_RX2', 'RX1_ONLY', 'RX2_ONLY')
+
+class Downlink:
+    """a queued downlink MAC command for one node."""
+    __slots__ = ('nodeid', 'kind', 'priority', 'length', 'on_delivery')
+
+    def __init__(self, nodeid: int, kind: str, priority: int, length: int,
+                 on_delivery: Optional[Callable[[], None]] = None):
+        self.nodeid = nodeid
+        self.kind = kind
+        self.priority = priority
+        self.length = length
+        self.on_delivery = on_delivery
+
+class GatewayScheduler:
+    """
+    gateway downlink scheduler for Class A receive windows.
+    RX1 uses the downlink channel the channel plan maps the uplink channel to, at the uplink SF
+    (RX1_DUTY_CYCLE per channel); RX2 uses a dedicated SF12 channel (RX2_DUTY_CYCLE).
+    duty-cycle state is kept in place and downlink airtimes are cached per (sf, length).
+    RX2 duty-cycle state is shared by all nodes; without shared_rx2 every node keeps its own,
+    as in the original simulator (where RX2 was never busy for other nodes).
+    queued MAC commands (e.g. ADR) are piggybacked on the next downlink to their node, in priority order.
+    """
+    def __init__(self, plan: Optional[ChannelPlan] = None, policy: str = 'RX1_RX2',
+                 rx1_duty_cycle: float = RX1_DUTY_CYCLE, rx2_duty_cycle: float = RX2_DUTY_CYCLE,
+                 shared_rx2: bool = True):
+        if policy not in RX_POLICIES:
+            raise ValueError(f"unknown RX policy '{policy}', expected one of {RX_POLICIES}")
+        self.policy = policy
+        self.rx1_duty_cycle = rx1_duty_cycle
+        self.rx2_duty_cycle = rx2_duty_cycle
+
+        plan = plan or get_channel_plan()
+        self.rx1_channels = plan.rx1_channels
+        self.rx1_free: List[float] = [0.0] * plan.nr_rx1_channels
+        self.shared_rx2 = shared_rx2
+        self.rx2_free = 0.0
+        self._rx2_free_per_node: Dict[int, float] = {}
+
+        self._airtime: Dict[Tuple[int, int], float] = {}
+        self._preamble = {sf: (8 + 4.25) * (2.0**sf) / (BANDWIDTH * 1000.0) for sf in range(7, 13)}
+        self._queues: Dict[int, List[Tuple[int, int, Downlink]]] = {}
+        self._seq = itertools.count()
+
+        # statistics
+        self.nr_rx1 = 0
+        self.nr_rx2 = 0
+        self.nr_missed = 0
+        self.nr_commands = 0
+
+    def downlink_airtime(self, sf: int, length: int) -> float:
+        """airtime of a downlink of length bytes (header included) at sf, cached."""
+        key = (sf, length)
+        at = self._airtime.get(key)
+        if at is None:
+            at = airtime(sf, 1, length, BANDWIDTH)
+            self._airtime[key] = at
+        return at
+
+    def enqueue(self, downlink: Downlink, replace: bool = True):
+        """queues a MAC command; with replace, an older command of the same kind is dropped."""
+        queue = self._queues.setdefault(downlink.nodeid, [])
+        if replace and any(d.kind == downlink.kind for _, _, d in queue):
+            queue[:] = [item for item in queue if item[2].kind != downlink.kind]
+            heapq.heapify(queue)
+        heapq.heappush(queue, (downlink.priority, next(self._seq), downlink))
+
+    def pending(self, nodeid: int) -> int:
+        return len(self._queues.get(nodeid, ()))
+
+    def _frame(self, nodeid: int) -> List[Downlink]:
+        """pops the highest-priority commands that fit in one downlink."""
+        queue = self._queues.get(nodeid)
+        frame: List[Downlink] = []
+        size = 0
+        while queue and size + queue[0][2].length <= FOPTS_MAX_LEN:
+            _, _, downlink = heapq.heappop(queue)
+            frame.append(downlink)
+            size += downlink.length
+        return frame
+
+    def requeue(self, frame: List[Downlink]):
+        """puts back the commands of a downlink the node did not receive."""
+        for downlink in frame:
+            self.enqueue(downlink, replace=False)
+
+    def schedule(self, packet: 'myPacket', env_now: float, node: 'myNode') -> Tuple[int, List[Downlink]]:
+        """
+        answers a received uplink (ending at env_now) in its receive windows.
+        adds the node's listening time to node.rxtime and returns (window, commands),
+        where window is 1 or 2, or 0 if the gateway could not answer in either window.
+        """
+        frame = self._frame(packet.nodeid)
+        length = ACK_MESS_LEN + LORAWAN_HEADER + sum(d.length for d in frame)
+
+        # 1. first window, downlink channel of the uplink channel and uplink sf
+        chanl_index = self.rx1_channels[packet.channel]
+        time_of_acking_1 = env_now + RX1_DELAY
+        if self.policy != 'RX2_ONLY' and time_of_acking_1 >= self.rx1_free[chanl_index]:
+            ack_airtime = self.downlink_airtime(packet.sf, length)
+            self.rx1_free[chanl_index] = time_of_acking_1 + ack_airtime / self.rx1_duty_cycle
+            node.rxtime += ack_airtime
+            self.nr_rx1 += 1
+            return 1, frame
+        # no answer in the first window, the node listens for the preamble
+        node.rxtime += self._preamble[packet.sf]
+
+        # 2. second window, sf12
+        if self.policy != 'RX1_ONLY':
+            time_of_acking_2 = env_now + RX2_DELAY
+            rx2_free = self.rx2_free if self.shared_rx2 else self._rx2_free_per_node.get(packet.nodeid, 0.0)
+            if time_of_acking_2 >= rx2_free:
+                ack_airtime = self.downlink_airtime(RX2_SF, length)
+                rx2_free = time_of_acking_2 + ack_airtime / self.rx2_duty_cycle
+                if self.shared_rx2:
+                    self.rx2_free = rx2_free
+                else:
+                    self._rx2_free_per_node[packet.nodeid] = rx2_free
+                node.rxtime += ack_airtime
+                self.nr_rx2 += 1
+                return 2, frame
+        node.rxtime += self._preamble[RX2_SF]
+
+        self.nr_missed += 1
+        self.requeue(frame)
+        return 0, []
+
+    def deliver(self, frame: List[Downlink]):
+        """applies the commands of a downlink the node received."""
+        for downlink in frame:
+            self.nr_commands += 1
+            if downlink.on_delivery is not None:
+                downlink.on_delivery()
+
+def gateway_from_config(config: dict) -> GatewayScheduler:
+    """builds the scheduler described by the optional GATEWAY section."""
+    settings = config.get('GATEWAY', {})
+    return GatewayScheduler(channel_plan_from_config(config), settings.get('RX_POLICY', 'RX1_RX2'),
+                            settings.get('RX1_DUTY_CYCLE', RX1_DUTY_CYCLE),
+                            settings.get('RX2_DUTY_CYCLE', RX2_DUTY_CYCLE),
+                            settings.get('SHARED_RX2', True))
@@ -0,0 +1,76 @@
+import numpy as np
+from typing import Dict
+
+class HistoryStore:
+    """
+    bounded per-node ADR history: one record (time, SF, TX power, ISR) per node and ADR interval
+    in which the node sent, as decided by the network server, plus the SFs the node actually applied
+    (a decision sent as a downlink may never arrive). all of it lives in preallocated ring buffers
+    so memory stays flat however long the simulation runs.
+    the optional summary keeps running totals over every record, including the overwritten ones.
+    """
+    def __init__(self, nr_nodes: int, capacity: int = 64, summary: bool = True):
+        self.capacity = capacity
+        self.time = np.zeros((nr_nodes, capacity), dtype=np.float64)
+        self.sf = np.zeros((nr_nodes, capacity), dtype=np.int8)
+        self.txpow = np.zeros((nr_nodes, capacity), dtype=np.int8)
+        self.isr = np.full((nr_nodes, capacity), np.nan, dtype=np.float32)
+        self.count = np.zeros(nr_nodes, dtype=np.int64)  # records written so far (head = count % capacity)
+        self.applied_sf = np.zeros((nr_nodes, capacity), dtype=np.int8)
+        self.applied_count = np.zeros(nr_nodes, dtype=np.int64)
+
+        self.has_summary = summary
+        if summary:
+            self.isr_sum = np.zeros(nr_nodes, dtype=np.float64)
+            self.sf_counts = np.zeros((nr_nodes, 6), dtype=np.int64)
+            self.sf_changes = np.zeros(nr_nodes, dtype=np.int64)
+
+    def record(self, nodeid: int, time: float, sf: int, txpow: float, isr: float):
+        """appends one record for a node, overwriting its oldest one when the ring is full."""
+        count = self.count[nodeid]
+        head = count % self.capacity
+        if self.has_summary:
+            if count > 0 and self.sf[nodeid, (count - 1) % self.capacity] != sf:
+                self.sf_changes[nodeid] += 1
+            self.sf_counts[nodeid, sf - 7] += 1
+            self.isr_sum[nodeid] += isr
+
+        self.time[nodeid, head] = time
+        self.sf[nodeid, head] = sf
+        self.txpow[nodeid, head] = txpow
+        self.isr[nodeid, head] = isr
+        self.count[nodeid] = count + 1
+
+    def record_applied(self, nodeid: int, sf: int):
+        """appends the SF a node has just switched to."""
+        count = self.applied_count[nodeid]
+        self.applied_sf[nodeid, count % self.capacity] = sf
+        self.applied_count[nodeid] = count + 1
+
+    def _order(self, count: int) -> np.ndarray:
+        if count <= self.capacity:
+            return np.arange(count)
+        return (np.arange(self.capacity) + count) % self.capacity
+
+    def history(self, nodeid: int) -> Dict[str, np.ndarray]:
+        """returns the retained records of a node, oldest first."""
+        order = self._order(self.count[nodeid])
+        return {'time': self.time[nodeid, order], 'sf': self.sf[nodeid, order],
+                'txpow': self.txpow[nodeid, order], 'isr': self.isr[nodeid, order]}
+
+    def sf_history(self, nodeid: int) -> np.ndarray:
+        """the retained SFs the node applied, oldest first."""
+        return self.applied_sf[nodeid, self._order(self.applied_count[nodeid])]
+
+    def summary(self) -> Dict[str, np.ndarray]:
+        """per-node totals over the whole run: records, SF changes, SF occupancy and mean ISR."""
+        if not self.has_summary:
+            raise ValueError("history summary is disabled")
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_isr = np.where(self.count > 0, self.isr_sum / self.count, np.nan)
+        return {'records': self.count.copy(), 'sf_changes': self.sf_changes.copy(),
+                'sf_counts': self.sf_counts.copy(), 'mean_isr': mean_isr}
+
+def history_from_config(config: dict, nr_nodes: int) -> HistoryStore:
+    settings = config.get('HISTORY', {})
+    return HistoryStore(nr_nodes, settings.get('CAPACITY', 64), settings.get('SUMMARY', True))
@@ -0,0 +1,115 @@
+import glob
+import json
+import os
+import socket
+import threading
+import time
+import simpy
+from typing import Callable, Dict, List, Optional, Tuple
+
+class CountingEnvironment(simpy.Environment):
+    """simpy environment that counts the events it processes."""
+    def __init__(self, initial_time: float = 0):
+        super().__init__(initial_time)
+        self.nr_events = 0
+
+    def step(self):
+        self.nr_events += 1
+        super().step()
+
+class MetricsReporter:
+    """
+    live progress of one simulation job, rewritten atomically as a small JSON file every interval
+    wall-clock seconds by a background thread, so slow or stalled jobs show up while they run.
+    snapshot() returns (in-flight packets, sent, received) and is called from the reporter thread.
+    """
+    def __init__(self, fname: str, env: CountingEnvironment, sim_end: float, job: Dict[str, object],
+                 snapshot: Callable[[], Tuple[int, int, int]], interval: float = 5.0):
+        self.fname = fname
+        self.env = env
+        self.sim_end = sim_end
+        self.job = dict(job, host=socket.gethostname(), pid=os.getpid())
+        self.snapshot = snapshot
+        self.interval = interval
+        self._started = time.time()
+        self._last = (self._started, 0, 0.0)  # wall time, events, sim time at the previous report
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics', daemon=True)
+
+    def start(self) -> 'MetricsReporter':
+        os.makedirs(os.path.dirname(self.fname) or '.', exist_ok=True)
+        self.write('running')
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write('running')
+            except Exception as e:  # never take the simulation down for a progress report
+                print(f"Error writing metrics to {self.fname}: {e}")
+
+    def metrics(self, status: str) -> Dict[str, object]:
+        now = time.time()
+        nr_events, sim_time = self.env.nr_events, self.env.now
+        last_wall, last_events, last_sim = self._last
+        self._last = (now, nr_events, sim_time)
+        in_flight, sent, received = self.snapshot()
+
+        wall_time = now - self._started
+        window = max(now - last_wall, 1e-9)
+        if status == 'running':
+            sim_rate = (sim_time - last_sim) / window
+        else:
+            sim_rate = sim_time / max(wall_time, 1e-9)
+        remaining = max(self.sim_end - sim_time, 0.0)
+        return dict(self.job, status=status, updated=now, wall_time=wall_time,
+                    sim_time=sim_time, sim_end=self.sim_end, sim_per_wall=sim_rate,
+                    events=nr_events, events_per_sec=(nr_events - last_events) / window,
+                    avg_events_per_sec=nr_events / max(wall_time, 1e-9),
+                    in_flight=in_flight, sent=sent, received=received,
+                    der=received / float(sent) if sent else 0.0,
+                    eta=remaining / sim_rate if sim_rate > 0 else None)
+
+    def write(self, status: str):
+        """rewrites the metrics file; readers never see a partial file."""
+        tmp = f"{self.fname}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.metrics(status), f)
+        os.replace(tmp, self.fname)
+
+    def close(self, status: str = 'done'):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.write(status)
+
+def metrics_environment(config: dict) -> simpy.Environment:
+    """the environment for a run: event-counting when METRICS is enabled."""
+    if config.get('METRICS', {}).get('ENABLED', False):
+        return CountingEnvironment()
+    return simpy.Environment()
+
+def metrics_reporter_from_config(config: dict, env: simpy.Environment, scenario_type: str, nr_nodes: int,
+                                 snapshot: Callable[[], Tuple[int, int, int]]) -> Optional[MetricsReporter]:
+    """returns a started reporter for the job when METRICS is enabled, None otherwise."""
+    settings = config.get('METRICS', {})
+    if not settings.get('ENABLED', False) or not isinstance(env, CountingEnvironment):
+        return None
+    seed = config['SIMULATION_PARAMS']['RND_SEED']
+    fname = os.path.join(settings.get('DIRECTORY', 'results/metrics'),
+                         f"{scenario_type}_{nr_nodes}_{seed}_{os.getpid()}.json")
+    job = {'type': scenario_type, 'nodes': nr_nodes, 'seed': seed}
+    return MetricsReporter(fname, env, config['EXPERIMENT_CONTROL']['SIMULATION_TIME'], job, snapshot,
+                           settings.get('INTERVAL', 5.0)).start()
+
+def read_metrics(directory: str) -> List[Dict[str, object]]:
+    """reads the metrics of every job in directory, most recently updated first."""
+    jobs = []
+    for fname in glob.glob(os.path.join(directory, '*.json')):
+        try:
+            with open(fname, 'r') as f:
+                jobs.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(jobs, key=lambda job: job.get('updated', 0), reverse=True)
@@ -0,0 +1,220 @@
+import math
+import numpy as np
+import simpy
+from typing import Dict, Iterator, List, Optional, Set, Tuple, TYPE_CHECKING
+from .lora_config import *
+from .lora_node import assignParameters
+from .lora_propagation import airtime
+
+if TYPE_CHECKING:
+    from .lora_node import myNode
+
+class GridIndex:
+    """
+    uniform grid over node positions.
+    moving a node only touches its old and new cell, and a radius query only visits the cells it overlaps.
+    """
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], Set[int]] = {}
+        self.where: Dict[int, Tuple[int, int]] = {}
+        self.positions: Dict[int, Tuple[float, float]] = {}
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return (int(x // self.cell_size), int(y // self.cell_size))
+
+    def __len__(self) -> int:
+        return len(self.where)
+
+    def __contains__(self, nodeid: int) -> bool:
+        return nodeid in self.where
+
+    def insert(self, nodeid: int, x: float, y: float):
+        cell = self._cell(x, y)
+        self.cells.setdefault(cell, set()).add(nodeid)
+        self.where[nodeid] = cell
+        self.positions[nodeid] = (x, y)
+
+    def remove(self, nodeid: int):
+        cell = self.where.pop(nodeid)
+        del self.positions[nodeid]
+        members = self.cells[cell]
+        members.discard(nodeid)
+        if not members:
+            del self.cells[cell]
+
+    def move(self, nodeid: int, x: float, y: float):
+        cell = self._cell(x, y)
+        old = self.where[nodeid]
+        self.positions[nodeid] = (x, y)
+        if cell == old:
+            return
+        members = self.cells[old]
+        members.discard(nodeid)
+        if not members:
+            del self.cells[old]
+        self.cells.setdefault(cell, set()).add(nodeid)
+        self.where[nodeid] = cell
+
+    def near(self, x: float, y: float, radius: float) -> Iterator[int]:
+        """yields the nodes within radius of (x, y)."""
+        cx, cy = self._cell(x, y)
+        reach = int(math.ceil(radius / self.cell_size))
+        for i in range(cx - reach, cx + reach + 1):
+            for j in range(cy - reach, cy + reach + 1):
+                for nodeid in self.cells.get((i, j), ()):
+                    px, py = self.positions[nodeid]
+                    if (px - x)**2 + (py - y)**2 <= radius**2:
+                        yield nodeid
+
+class RandomWaypoint:
+    """
+    random-waypoint mobility inside the cell: pause, then move in a straight line at a random speed
+    to a uniformly drawn waypoint, and repeat. legs are only drawn when position_at gets past them.
+    """
+    __slots__ = ('rng', 'max_dist', 'bsx', 'bsy', 'speed', 'pause',
+                 'x0', 'y0', 'depart', 'x1', 'y1', 'arrive', 'leave')
+
+    def __init__(self, x: float, y: float, t: float, rng: np.random.Generator, max_dist: float,
+                 bsx: float, bsy: float, speed: Tuple[float, float], pause: Tuple[float, float]):
+        self.rng = rng
+        self.max_dist = max_dist
+        self.bsx = bsx
+        self.bsy = bsy
+        self.speed = speed
+        self.pause = pause
+        # start paused at (x, y)
+        self.x0 = self.x1 = x
+        self.y0 = self.y1 = y
+        self.depart = self.arrive = t
+        self.leave = t + rng.uniform(*pause)
+
+    def _next_leg(self):
+        r = self.max_dist * math.sqrt(self.rng.random())
+        theta = 2 * math.pi * self.rng.random()
+        self.x0, self.y0, self.depart = self.x1, self.y1, self.leave
+        self.x1 = self.bsx + r * math.cos(theta)
+        self.y1 = self.bsy + r * math.sin(theta)
+        length = math.hypot(self.x1 - self.x0, self.y1 - self.y0)
+        self.arrive = self.depart + length / self.rng.uniform(*self.speed)
+        self.leave = self.arrive + self.rng.uniform(*self.pause)
+
+    def position_at(self, t: float) -> Tuple[float, float]:
+        while t >= self.leave:
+            self._next_leg()
+        if t >= self.arrive:
+            return self.x1, self.y1
+        if t <= self.depart:
+            return self.x0, self.y0
+        f = (t - self.depart) / (self.arrive - self.depart)
+        return self.x0 + f * (self.x1 - self.x0), self.y0 + f * (self.y1 - self.y0)
+
+class NetworkDynamics:
+    """
+    mobility and churn for one run.
+    mobile nodes follow RandomWaypoint; their position, distance and path loss are only brought up to
+    date when they transmit. with churn, nodes join at a uniform time in [0, join_spread] at a fresh
+    position and leave after an exponential lifetime, removed by one leave process at the exact time.
+    the grid index holds the active nodes.
+    """
+    def __init__(self, nodes: List['myNode'], max_dist: float, bsx: float, bsy: float, seed: int,
+                 mobile_fraction: float = 0.0, speed: Tuple[float, float] = (0.5, 1.5),
+                 pause: Tuple[float, float] = (0.0, 600.0), join_spread: float = 0.0,
+                 mean_lifetime: float = 0.0, min_spacing: float = 10.0):
+        self.rng = np.random.default_rng(seed)
+        self.nodes = nodes
+        self.max_dist = max_dist
+        self.bsx = bsx
+        self.bsy = bsy
+        self.speed = tuple(speed)
+        self.pause = tuple(pause)
+        self.min_spacing = min_spacing
+        self.index = GridIndex(max(min_spacing, max_dist / 256))
+        self.models: Dict[int, RandomWaypoint] = {}
+        self.mobile = set(int(i) for i in np.flatnonzero(self.rng.random(len(nodes)) < mobile_fraction))
+        self.nr_joins = 0
+        self.nr_leaves = 0
+
+        for node in nodes:
+            node.dynamics = self
+            if join_spread > 0:
+                node.join_time = float(self.rng.uniform(0.0, join_spread))
+            if mean_lifetime > 0:
+                node.leave_time = node.join_time + float(self.rng.exponential(mean_lifetime))
+            if node.join_time == 0.0:
+                self._activate(node, 0.0)
+
+    def _activate(self, node: 'myNode', now: float):
+        self.index.insert(node.nodeid, node.x, node.y)
+        if node.nodeid in self.mobile:
+            self.models[node.nodeid] = RandomWaypoint(node.x, node.y, now, self.rng, self.max_dist,
+                                                      self.bsx, self.bsy, self.speed, self.pause)
+
+    def _free_position(self) -> Tuple[float, float]:
+        """radial placement as myNode._place_node, spacing checked against the active nodes only."""
+        for _ in range(1000):
+            a, b = self.rng.random(), self.rng.random()
+            if b < a: a, b = b, a
+            b = max(b, 1e-12)
+            x = b * self.max_dist * math.cos(2 * math.pi * a / b) + self.bsx
+            y = b * self.max_dist * math.sin(2 * math.pi * a / b) + self.bsy
+            if next(self.index.near(x, y, self.min_spacing), None) is None:
+                return x, y
+        raise RuntimeError(f"could not place a joining node at least {self.min_spacing} m from the "
+                           f"{len(self.index)} active nodes")
+
+    def join(self, node: 'myNode', now: float):
+        """a device that joins is placed afresh and gets the initial SF for its new position."""
+        node.move_to(*self._free_position())
+        parameters = assignParameters(node.nodeid, node.dist, channel=node.parameters.channel)
+        node.parameters = parameters
+        node.packet.sf = parameters.sf
+        node.packet.pl = LORAWAN_HEADER + PCKT_LENGTH_SF[parameters.sf - 7]
+        node.packet.rectime = airtime(parameters.sf, parameters.cr, node.packet.pl, parameters.bw)
+        self._activate(node, now)
+        self.nr_joins += 1
+
+    def start(self, env: simpy.Environment):
+        """removes every node from the network at its leave time, whatever its transmit loop is doing."""
+        leaving = sorted((node.leave_time, node.nodeid, node) for node in self.nodes if node.leave_time < math.inf)
+        if leaving:
+            env.process(self._leave_process(env, leaving))
+
+    def _leave_process(self, env: simpy.Environment, leaving: List[Tuple[float, int, 'myNode']]):
+        for leave_time, _, node in leaving:
+            if leave_time > env.now:
+                yield env.timeout(leave_time - env.now)
+            self.leave(node)
+
+    def leave(self, node: 'myNode'):
+        """takes the node out of the network; its transmit loop stops at its next wake-up."""
+        if node.nodeid not in self.index:
+            return
+        self.index.remove(node.nodeid)
+        self.models.pop(node.nodeid, None)
+        self.nr_leaves += 1
+
+    def refresh(self, node: 'myNode', now: float):
+        """brings a mobile node's position (and path loss) up to date before it transmits."""
+        model = self.models.get(node.nodeid)
+        if model is None:
+            return
+        x, y = model.position_at(now)
+        if x != node.x or y != node.y:
+            node.move_to(x, y)
+            self.index.move(node.nodeid, x, y)
+
+def dynamics_from_config(config: dict, nodes: List['myNode'], max_dist: float, bsx: float, bsy: float,
+                         seed: int) -> Optional[NetworkDynamics]:
+    """returns the dynamics described by the MOBILITY and CHURN sections, or None if both are disabled."""
+    mobility = config.get('MOBILITY', {})
+    churn = config.get('CHURN', {})
+    if not mobility.get('ENABLED', False) and not churn.get('ENABLED', False):
+        return None
+    kwargs = {}
+    if mobility.get('ENABLED', False):
+        kwargs.update(mobile_fraction=mobility.get('FRACTION', 1.0), speed=mobility.get('SPEED', (0.5, 1.5)),
+                      pause=mobility.get('PAUSE', (0.0, 600.0)))
+    if churn.get('ENABLED', False):
+        kwargs.update(join_spread=churn.get('JOIN_SPREAD', 0.0), mean_lifetime=churn.get('MEAN_LIFETIME', 0.0))
+    return NetworkDynamics(nodes, max_dist, bsx, bsy, seed, **kwargs)
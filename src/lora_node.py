@@ -2,21 +2,27 @@ import numpy as np
 import math
 import random
 import simpy
-from typing import List, TYPE_CHECKING
+from typing import List, Optional, Tuple, TYPE_CHECKING
 from .lora_config import *
 from .lora_propagation import airtime
+from .lora_channels import get_channel_plan
 import sys
 
 if TYPE_CHECKING:
+    from .lora_history import HistoryStore
+    from .lora_energy import EnergyMeter
+    from .lora_mobility import NetworkDynamics
     class SimPyEnv:
         now: float
     class myNode:
         env: SimPyEnv
 
 class myPacket:
-    def __init__(self, nodeid: int, freq: int, sf: int, bw: int, cr: int, txpow: float, distance: float):
+    def __init__(self, nodeid: int, freq: int, sf: int, bw: int, cr: int, txpow: float, distance: float,
+                 channel: int = 0):
         self.nodeid = nodeid
         self.freq = freq
+        self.channel = channel  # index in the active channel plan
         self.sf = sf
         self.bw = bw
         self.cr = cr
@@ -43,14 +49,25 @@ class myPacket:
 
 
 class assignParameters:
-    """assigns initial sf and parameters based on distance (adr-like)."""
-    def __init__(self, nodeid: int, distance: float):
+    """
+    assigns initial sf and parameters based on distance (adr-like).
+    the channel is drawn from the active channel plan and sets the frequency and bandwidth.
+    sf and channel can be given to reuse an assignment computed earlier (e.g. a shared topology).
+    """
+    def __init__(self, nodeid: int, distance: float, sf: Optional[int] = None, channel: Optional[int] = None):
+        plan = get_channel_plan()
         self.nodeid = nodeid
         self.txpow = TX_POWER
-        self.bw = BANDWIDTH
         self.cr = CODING_RATE
         self.sf = 12
-        self.freq = random.choice([872000000, 864000000, 860000000])
+        self.channel = random.randrange(plan.nr_channels) if channel is None else channel
+        self.freq = plan.frequencies[self.channel]
+        self.bw = plan.bandwidths[self.channel]
+
+        if sf is not None:
+            self.sf = sf
+            self.rectime = airtime(self.sf, self.cr, LORAWAN_HEADER + PCKT_LENGTH_SF[self.sf - 7], self.bw)
+            return
 
         Lpl = LPLD0 + 10 * GAMMA * math.log10(distance / D0)
         Prx = self.txpow - GL - Lpl
@@ -74,7 +91,8 @@ class assignParameters:
             self.sf = min_sf
 
 class myNode:
-    def __init__(self, nodeid: int, bs: int, period: float, datasize: float, max_dist: float, bsx: float, bsy: float, nodes_list: List):
+    def __init__(self, nodeid: int, bs: int, period: float, datasize: float, max_dist: float, bsx: float, bsy: float, nodes_list: List,
+                 position: Optional[Tuple[float, float]] = None):
         self.nodeid = nodeid
         self.buffer = datasize
         self.bs = bs
@@ -92,11 +110,23 @@ class myNode:
 
         self.last_sent_count = 0
         self.last_recv_count = 0
-        self.sf_history = []
         self.adr_change_pending = False
+        self.history: Optional['HistoryStore'] = None  # shared ring-buffer store, set when ADR runs
+        self.meter: Optional['EnergyMeter'] = None  # shared energy meter, set by the simulation
+
+        # mobility and churn (see lora_mobility), the node is static and always present without them
+        self.dynamics: Optional['NetworkDynamics'] = None
+        self.join_time = 0.0
+        self.leave_time = math.inf
         
-        self.x, self.y = self._place_node(max_dist, bsx, bsy, nodes_list)
+        if position is None:
+            self.x, self.y = self._place_node(max_dist, bsx, bsy, nodes_list)
+        else:
+            self.x, self.y = position
+        self.bsx, self.bsy = bsx, bsy
         self.dist = np.sqrt((self.x - bsx)**2 + (self.y - bsy)**2)
+        # mean path loss (without shadowing), updated by move_to
+        self.path_loss = LPLD0 + 10 * GAMMA * math.log10(self.dist / D0)
 
         self.txpow = TX_POWER 
         self.parameters = None
@@ -106,6 +136,19 @@ class myNode:
         self.last_value = 0.0 
         self.value_threshold = 0.4
 
+    def move_to(self, x: float, y: float):
+        """moves the node and updates its distance and mean path loss to the BS."""
+        self.x, self.y = x, y
+        self.dist = math.hypot(x - self.bsx, y - self.bsy)
+        self.path_loss = LPLD0 + 10 * GAMMA * math.log10(max(self.dist, 1e-3) / D0)
+
+    @property
+    def sf_history(self) -> List[int]:
+        """SFs applied by the node after ADR commands (the retained ones), oldest first."""
+        if self.history is None:
+            return []
+        return self.history.sf_history(self.nodeid).tolist()
+
     def _place_node(self, max_dist, bsx, bsy, nodes_list):
         """place node using an adapted radial distribution."""
         rounds = 0
@@ -130,6 +173,24 @@ class myNode:
         print("Could not place new node, giving up")
         sys.exit(-1)
         
+    def next_event_delay(self, batch: int = 8) -> float:
+        """
+        samples the idle time until the next event directly, instead of polling check_event.
+        the sensed value follows the same random walk, drawn in batches; every step that stays
+        below the threshold costs one polling interval of uniform(0.5, 1.5) * period / 2.
+        """
+        idle = 0.0
+        while True:
+            steps = np.random.normal(0, 2.0, batch)
+            hits = np.flatnonzero(np.abs(steps) > self.value_threshold)
+            misses = hits[0] if hits.size else batch
+            if misses:
+                idle += np.random.uniform(0.5, 1.5, misses).sum() * self.period / 2.0
+            if hits.size:
+                self.last_value += steps[:misses + 1].sum()
+                return idle
+            self.last_value += steps.sum()
+
     def check_event(self) -> bool:
         """simulates event-based sensing."""
         current_value = self.last_value + np.random.normal(0, 2.0)
@@ -0,0 +1,116 @@
+import copy
+import itertools
+import multiprocessing
+from typing import Dict, List, Optional, Tuple
+
+from .lora_simulator import run_simulation, calculate_stats, reset_global_counters
+from .lora_topology import Topology, get_topology, seed_random, topology_cache_from_config
+from .lora_channels import set_channel_plan, channel_plan_from_config
+from .lora_results import ResultWriter, append_rows, sanitize, result_writer_from_config
+
+# config sections whose keys may be swept, addressed as "SECTION.KEY"
+SWEEPABLE_SECTIONS = ('SIMULATION_PARAMS', 'CR_ADR', 'EXPERIMENT_CONTROL')
+
+# topology shared with the forked workers (copy-on-write)
+_SHARED_TOPOLOGY: Optional[Topology] = None
+
+def expand_grid(grid: Dict[str, list]) -> List[Dict[str, object]]:
+    """expands {"SECTION.KEY": [values]} into the list of all parameter points."""
+    for key in grid:
+        section, _, name = key.partition('.')
+        if section not in SWEEPABLE_SECTIONS or not name:
+            raise ValueError(f"cannot sweep '{key}', expected one of {SWEEPABLE_SECTIONS} as 'SECTION.KEY'")
+        if key == 'SIMULATION_PARAMS.RND_SEED':
+            raise ValueError("seeds are swept through PARAM_SWEEP.SEEDS, not the grid")
+
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+def apply_point(config: dict, point: Dict[str, object]) -> dict:
+    """returns a copy of config with the parameter point applied."""
+    config = copy.deepcopy(config)
+    for key, value in point.items():
+        section, _, name = key.partition('.')
+        config[section][name] = value
+    return config
+
+def _run_point(task: Tuple[dict, int, int, str]):
+    """runs one parameter point on the shared topology."""
+    config, nr_nodes, seed, scenario_type = task
+    config['SIMULATION_PARAMS']['RND_SEED'] = seed
+    config['SIMULATION_PARAMS']['NR_NODES'] = nr_nodes
+
+    # same seed for every point: all variants see the same random traffic
+    reset_global_counters()
+    seed_random(seed)
+    nodes, sim_time = run_simulation(config, nr_nodes, is_modified=(scenario_type == 'MODIFIED'),
+                                     topology=_SHARED_TOPOLOGY)
+    return calculate_stats(nodes, sim_time, config)
+
+def save_sweep_results(fname: str, seed: int, nr_nodes: int, scenario_type: str,
+                       point: Dict[str, object], results: tuple, writer: Optional[ResultWriter] = None):
+    """saves one parameter point result to a .dat file, through the background writer when one is given."""
+    (sent, nr_collisions, nr_lost, nr_lost_error, nr_no_ack, nr_ack_lost,
+     sim_time, der1, der2, energy, nodefair, sf_distribution) = results
+
+    sf_str = "_".join(map(str, sf_distribution))
+    values = ", ".join(str(v) for v in point.values())
+    row = sanitize(f"{seed}, {nr_nodes}, {scenario_type}, {values}, {sent}, "
+                   f"{nr_collisions}, {nr_lost}, {nr_lost_error}, {nr_no_ack}, {nr_ack_lost}, "
+                   f"{sim_time}, {der1:.4f}, {der2:.4f}, {energy:.4f}, {nodefair:.4f}, {sf_str}")
+    keys = ", ".join(point.keys())
+    header = sanitize(f"#seed, nodes, Type, {keys}, sent, coll, lost, lostErr, noAck, ackLost, "
+                      f"time, DER1, DER2, Energy, Fair, SFs")
+
+    if writer is not None:
+        writer.write(fname, row, header)
+    else:
+        append_rows(fname, [row], header)
+
+def run_param_sweep(config: dict, workers: Optional[int] = None):
+    """
+    runs every point of PARAM_SWEEP.GRID for each seed and node count.
+    the topology for a (seed, node count) pair is built once and shared by all points;
+    with several workers it is inherited by forked processes without being copied,
+    and with TOPOLOGY_CACHE enabled it is loaded memory-mapped from disk when available.
+    """
+    global _SHARED_TOPOLOGY
+
+    settings = config['PARAM_SWEEP']
+    points = expand_grid(settings['GRID'])
+    node_scenarios = settings.get('NODE_SCENARIOS', config['NODE_SCENARIOS'])
+    seeds = settings.get('SEEDS', [config['SIMULATION_PARAMS']['RND_SEED']])
+    scenario_types = settings.get('SCENARIO_TYPES', ['MODIFIED'])
+    nr_workers = settings.get('WORKERS', 1) if workers is None else workers
+    fname = settings['OUTPUT_FILENAME']
+    cache = topology_cache_from_config(config)
+    set_channel_plan(channel_plan_from_config(config))
+
+    if nr_workers > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+        # the workers inherit the shared topology and the loaded configuration by forking
+        print("Parallel sweep workers need the 'fork' start method, running the points sequentially")
+        nr_workers = 1
+
+    print(f"--- STARTING PARAMETER SWEEP ({len(points)} points) ---")
+
+    for seed in seeds:
+        for nr_nodes in node_scenarios:
+            print(f"\n[SWEEP: {nr_nodes} NODOS, seed {seed}]")
+            _SHARED_TOPOLOGY = get_topology(nr_nodes, seed, cache)
+
+            jobs = [(point, scenario_type) for point in points for scenario_type in scenario_types]
+            tasks = [(apply_point(config, point), nr_nodes, seed, scenario_type) for point, scenario_type in jobs]
+            if nr_workers > 1:
+                # fork after building the topology so the workers share its pages
+                with multiprocessing.get_context('fork').Pool(nr_workers) as pool:
+                    results = pool.map(_run_point, tasks)
+            else:
+                results = [_run_point(task) for task in tasks]
+
+            # the writer thread only runs between the forks, never while one happens
+            with result_writer_from_config(config) as writer:
+                for (point, scenario_type), stats in zip(jobs, results):
+                    save_sweep_results(fname, seed, nr_nodes, scenario_type, point, stats, writer)
+
+    _SHARED_TOPOLOGY = None
+    print("\n--- PARAMETER SWEEP COMPLETED ---")
@@ -0,0 +1,277 @@
+import math
+import random
+import numpy as np
+import simpy
+from typing import List, Tuple
+from .lora_config import *
+from .lora_propagation import per, airtime
+from .lora_collision import check_collision, arrival_batcher_from_config
+from .lora_gateway import GatewayScheduler, gateway_from_config
+from .lora_topology import network_geometry
+from .lora_energy import EnergyMeter
+from .lora_metrics import metrics_environment, metrics_reporter_from_config
+from .lora_channels import get_channel_plan, set_channel_plan, channel_plan_from_config
+
+class _Uplink:
+    """
+    lightweight in-flight packet of the population model.
+    it acts as its own 'node' (.packet, .env, .rxtime) so the collision and ack checks can be reused.
+    """
+    __slots__ = ('nodeid', 'freq', 'channel', 'sf', 'bw', 'cr', 'txpow', 'pl', 'rectime', 'rssi',
+                 'collided', 'processed', 'lost', 'perror', 'acked', 'acklost', 'addTime',
+                 'env', 'rxtime')
+
+    def __init__(self, env: simpy.Environment, nodeid: int, device_class: 'DeviceClass', rssi: float):
+        self.nodeid = nodeid
+        self.freq = device_class.freq
+        self.channel = device_class.channel
+        self.sf = device_class.sf
+        self.bw = device_class.bw
+        self.cr = CODING_RATE
+        self.txpow = TX_POWER
+        self.pl = device_class.pl
+        self.rectime = device_class.rectime
+        self.rssi = rssi
+        self.collided = 0
+        self.processed = 0
+        self.lost = False
+        self.perror = False
+        self.acked = 0
+        self.acklost = 0
+        self.addTime = env.now
+        self.env = env
+        self.rxtime = 0.0
+
+    @property
+    def packet(self) -> '_Uplink':
+        return self
+
+class DeviceClass:
+    """homogeneous group of devices sharing SF, channel and period."""
+    def __init__(self, sf: int, channel: int, period: float, members: np.ndarray):
+        plan = get_channel_plan()
+        self.sf = sf
+        self.channel = channel
+        self.freq = plan.frequencies[channel]
+        self.bw = plan.bandwidths[channel]
+        self.period = period
+        self.members = members
+        self.pl = LORAWAN_HEADER + PCKT_LENGTH_SF[sf - 7]
+        self.rectime = airtime(sf, CODING_RATE, self.pl, self.bw)
+
+class Population:
+    """
+    population-scale network: per-device state lives in arrays and devices are grouped in classes.
+    placement uses the same radial distribution as myNode, without the minimum-spacing check.
+    """
+    def __init__(self, nr_nodes: int, period: float, datasize: float):
+        max_dist, bsx, bsy = network_geometry()
+        self.nr_nodes = nr_nodes
+        self.period = period
+
+        # vectorized radial placement (see myNode._place_node)
+        a, b = np.random.random(nr_nodes), np.random.random(nr_nodes)
+        a, b = np.minimum(a, b), np.maximum(a, b)
+        b = np.maximum(b, 1e-12)
+        self.x = b * max_dist * np.cos(2 * math.pi * a / b) + bsx
+        self.y = b * max_dist * np.sin(2 * math.pi * a / b) + bsy
+        self.dist = np.sqrt((self.x - bsx)**2 + (self.y - bsy)**2)
+        self.path_loss = LPLD0 + 10 * GAMMA * np.log10(np.maximum(self.dist, 1e-3) / D0)
+
+        # initial sf: smallest sf that satisfies the link budget on the channel bandwidth (see assignParameters)
+        plan = get_channel_plan()
+        self.channel = np.random.randint(0, plan.nr_channels, nr_nodes).astype(np.uint8)
+        prx = TX_POWER - GL - self.path_loss
+        bw_column = np.array([[125, 250, 500].index(bw) + 1 for bw in plan.bandwidths])[self.channel]
+        sensi = SENSI[:, bw_column].T  # (nr_nodes, 6)
+        feasible = sensi < prx[:, np.newaxis]
+        self.sf = np.where(feasible.any(axis=1), np.argmax(feasible, axis=1) + 7, 12).astype(np.int8)
+
+        # per-device state and counters
+        self.buffer = np.full(nr_nodes, datasize, dtype=np.float64)
+        self.lstretans = np.zeros(nr_nodes, dtype=np.int32)
+        self.sent = np.zeros(nr_nodes, dtype=np.int32)
+        self.recv = np.zeros(nr_nodes, dtype=np.int32)
+        self.coll = np.zeros(nr_nodes, dtype=np.int32)
+        self.lost = np.zeros(nr_nodes, dtype=np.int32)
+        self.losterror = np.zeros(nr_nodes, dtype=np.int32)
+        self.noack = np.zeros(nr_nodes, dtype=np.int32)
+        self.acklost = np.zeros(nr_nodes, dtype=np.int32)
+        self.rxtime = np.zeros(nr_nodes, dtype=np.float64)
+        self.meter = EnergyMeter(nr_nodes)
+
+        self.classes: List[DeviceClass] = []
+        self.class_of = np.empty(nr_nodes, dtype=np.int32)
+        key = (self.sf.astype(np.int32) - 7) * plan.nr_channels + self.channel
+        for k in np.unique(key):
+            members = np.flatnonzero(key == k)
+            sf, chan = divmod(int(k), plan.nr_channels)
+            self.class_of[members] = len(self.classes)
+            self.classes.append(DeviceClass(sf + 7, chan, period, members))
+
+class PopulationSimulator:
+    """
+    drives a Population: each class emits a merged Poisson stream of first uplinks,
+    and follow-up uplinks (new data or retransmissions) are plain scheduled callbacks.
+    no SimPy process or object is kept per device.
+    """
+    def __init__(self, env: simpy.Environment, population: Population, full_collision: int, max_bs_receives: int,
+                 gateway: GatewayScheduler):
+        self.env = env
+        self.pop = population
+        self.full_collision = full_collision
+        self.max_bs_receives = max_bs_receives
+        self.packets_at_bs: List[_Uplink] = []
+        self.gateway = gateway
+        self.batcher = None
+        self.sensitivity = {(sf, bw): SENSI[sf - 7, [125, 250, 500].index(bw) + 1]
+                            for sf in range(7, 13) for bw in (125, 250, 500)}
+        self.retrans_delay = {}
+        self.demod_time = 0.0  # airtime of the uplinks that reached the demodulators
+
+    def class_process(self, device_class: DeviceClass):
+        """merged arrival stream of the first uplink of every device in the class."""
+        # superposition of the per-device exponential clocks: the next device is uniform among the waiting ones
+        waiting = np.random.permutation(device_class.members)
+        for remaining in range(len(waiting), 0, -1):
+            yield self.env.timeout(random.expovariate(remaining / device_class.period))
+            self._start_uplink(int(waiting[remaining - 1]))
+
+    def _schedule(self, delay: float, nodeid: int):
+        self.env.timeout(delay).callbacks.append(lambda _, nodeid=nodeid: self._start_uplink(nodeid))
+
+    def _start_uplink(self, nodeid: int):
+        pop = self.pop
+        device_class = pop.classes[pop.class_of[nodeid]]
+        pop.buffer[nodeid] -= device_class.pl - LORAWAN_HEADER
+
+        lpl = pop.path_loss[nodeid]
+        if VAR > 0: lpl += np.random.normal(0, VAR)
+        uplink = _Uplink(self.env, nodeid, device_class, TX_POWER - GL - lpl)
+        pop.sent[nodeid] += 1
+        pop.meter.add_tx(nodeid, uplink.rectime, uplink.txpow)
+
+        if uplink.rssi < self.sensitivity[uplink.sf, uplink.bw]:
+            uplink.lost = True
+        else:
+            if per(uplink.sf, uplink.bw, uplink.cr, uplink.rssi, uplink.pl) >= random.uniform(0, 1):
+                uplink.perror = True
+            else:
+                self.demod_time += uplink.rectime
+                if self.batcher is not None:
+                    self.batcher.add(uplink)
+                else:
+                    if check_collision(uplink, self.packets_at_bs, self.max_bs_receives, self.full_collision) == 1:
+                        uplink.collided = 1
+                    self.packets_at_bs.append(uplink)
+
+        self.env.timeout(uplink.rectime).callbacks.append(lambda _, uplink=uplink: self._end_uplink(uplink))
+
+    def _end_uplink(self, uplink: _Uplink):
+        pop = self.pop
+        nodeid = uplink.nodeid
+
+        if not uplink.lost and not uplink.perror and uplink.collided == 0:
+            window, _ = self.gateway.schedule(uplink, self.env.now, uplink)
+            if window != 0:
+                uplink.acked = 1
+                dl_rssi = TX_POWER - pop.path_loss[nodeid]
+                if VAR > 0: dl_rssi -= np.random.normal(0, VAR)
+                uplink.acklost = 1 if dl_rssi < self.sensitivity[uplink.sf, uplink.bw] else 0
+            pop.meter.add_windows(nodeid, window, uplink.rxtime, uplink.sf, uplink.bw)
+        else:
+            pop.meter.add_unanswered(nodeid, uplink.sf, uplink.bw)
+        pop.rxtime[nodeid] += uplink.rxtime
+
+        if uplink.lost:
+            pop.lost[nodeid] += 1; pop.lstretans[nodeid] += 1
+        elif uplink.perror:
+            pop.losterror[nodeid] += 1
+        elif uplink.collided == 1:
+            pop.coll[nodeid] += 1; pop.lstretans[nodeid] += 1
+        elif uplink.acked == 0:
+            pop.noack[nodeid] += 1; pop.lstretans[nodeid] += 1
+        elif uplink.acklost == 1:
+            pop.acklost[nodeid] += 1; pop.lstretans[nodeid] += 1
+        else:
+            pop.recv[nodeid] += 1; pop.lstretans[nodeid] = 0
+
+        if not uplink.lost and not uplink.perror:
+            self.packets_at_bs.remove(uplink)
+
+        # next uplink, same rules as transmit()
+        if pop.buffer[nodeid] > 0.0:
+            if 0 < pop.lstretans[nodeid] <= 8:
+                pop.buffer[nodeid] += uplink.pl - LORAWAN_HEADER
+                self._schedule(self._retrans_delay(uplink) + random.expovariate(1.0 / 2000.0), nodeid)
+            else:
+                self._schedule(random.expovariate(1.0 / pop.period), nodeid)
+
+    def _retrans_delay(self, uplink: _Uplink) -> float:
+        delay = self.retrans_delay.get((uplink.sf, uplink.bw))
+        if delay is None:
+            delay = max(2.0 + airtime(12, CODING_RATE, ACK_MESS_LEN + LORAWAN_HEADER, BANDWIDTH),
+                        uplink.rectime * ((1 - 0.01) / 0.01))
+            self.retrans_delay[uplink.sf, uplink.bw] = delay
+        return delay
+
+def run_population_simulation(config: dict, nr_nodes: int) -> Tuple[Population, float]:
+    """runs the population-scale model (periodic Base traffic) for nr_nodes devices."""
+    sim_params = config['SIMULATION_PARAMS']
+    exp_ctrl = config['EXPERIMENT_CONTROL']
+
+    set_channel_plan(channel_plan_from_config(config))
+    env = metrics_environment(config)
+    population = Population(nr_nodes, sim_params['AVG_SEND_TIME'], sim_params['DATA_SIZE'])
+    simulator = PopulationSimulator(env, population, sim_params['FULL_COLLISION_MODEL'], exp_ctrl['MAX_BS_RECEIVES'],
+                                    gateway_from_config(config))
+    simulator.batcher = arrival_batcher_from_config(config, env, simulator.packets_at_bs)
+    for device_class in population.classes:
+        env.process(simulator.class_process(device_class))
+
+    reporter = metrics_reporter_from_config(
+        config, env, 'POPULATION', nr_nodes,
+        lambda: (len(simulator.packets_at_bs), int(population.sent.sum()), int(population.recv.sum())))
+    try:
+        env.run(until=exp_ctrl['SIMULATION_TIME'])
+    finally:
+        if reporter is not None:
+            reporter.close('done' if env.now >= exp_ctrl['SIMULATION_TIME'] else 'failed')
+    return population, env.now
+
+def calculate_population_stats(population: Population, sim_time: float, config: dict):
+    """calculates and prints final statistics, in the same format as calculate_stats."""
+    pop = population
+    sent = int(pop.sent.sum())
+    nr_received = int(pop.recv.sum())
+    nr_collisions = int(pop.coll.sum())
+    nr_lost = int(pop.lost.sum())
+    nr_lost_error = int(pop.losterror.sum())
+    nr_no_ack = int(pop.noack.sum())
+    nr_ack_lost = int(pop.acklost.sum())
+
+    # energy calculation (tx, rx, idle and sleep, accumulated during the run)
+    energy = pop.meter.total(sim_time)
+
+    # fairness index
+    active = pop.sent > 0
+    if active.any():
+        recv_rates = pop.recv[active] / pop.sent[active]
+        nodefair = (np.sum(recv_rates)**2) / (len(recv_rates) * np.sum(recv_rates**2))
+    else:
+        nodefair = 0
+
+    sf_distribution = [int(c) for c in np.bincount(pop.sf.astype(np.int64) - 7, minlength=6)]
+
+    der1 = (sent - nr_collisions - nr_lost - nr_lost_error - nr_no_ack - nr_ack_lost) / float(sent) if sent != 0 else 0
+    der2 = nr_received / float(sent) if sent != 0 else 0
+
+    print("\n=================== Results ===================")
+    print(f"Nodes: {pop.nr_nodes} | Time: {sim_time:.2f}s | Classes: {len(pop.classes)}")
+    print(f"Sent: {sent} | Received: {nr_received}")
+    print(f"DER: {der2:.4f} | Energy: {energy:.4f} J")
+    print(f"Collisions: {nr_collisions}")
+    print("==================================================")
+
+    return (sent, nr_collisions, nr_lost, nr_lost_error, nr_no_ack, nr_ack_lost,
+            sim_time, der1, der2, energy, nodefair, sf_distribution)
@@ -0,0 +1,163 @@
+import os
+import queue
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, appends are then only safe within one process
+    fcntl = None
+
+RESULTS_HEADER = ("#seed, collType, nodes, rate, size, sent, coll, lost, lostErr, noAck, ackLost, "
+                  "time, DER1, DER2, Energy, Fair, SFs, Type")
+
+_UNSAFE_CHARS = re.compile(r'[^\#a-zA-Z0-9 \n\.\,\"_]')
+
+def sanitize(text: str) -> str:
+    """drops the characters that are not allowed in the .dat files."""
+    return _UNSAFE_CHARS.sub('', text)
+
+def format_result_row(config: dict, results: tuple, scenario_type: str = "UNKNOWN", nr_nodes: int = 0) -> str:
+    """formats the statistics of one scenario as a row of the results file."""
+    sim_params = config['SIMULATION_PARAMS']
+    nodes_count = nr_nodes if nr_nodes > 0 else sim_params['NR_NODES']
+
+    (sent, nr_collisions, nr_lost, nr_lost_error, nr_no_ack, nr_ack_lost,
+     sim_time, der1, der2, energy, nodefair, sf_distribution) = results
+
+    sf_str = "_".join(map(str, sf_distribution))
+    return sanitize(f"{sim_params['RND_SEED']}, {sim_params['FULL_COLLISION_MODEL']}, {nodes_count}, "
+                    f"{sim_params['AVG_SEND_TIME']}, {sim_params['DATA_SIZE']}, {sent}, "
+                    f"{nr_collisions}, {nr_lost}, {nr_lost_error}, {nr_no_ack}, {nr_ack_lost}, "
+                    f"{sim_time}, {der1:.4f}, {der2:.4f}, {energy:.4f}, {nodefair:.4f}, {sf_str}, {scenario_type}")
+
+def append_rows(fname: str, rows: List[str], header: str):
+    """
+    appends rows to fname with a single write under an exclusive lock,
+    so rows from concurrent writers (threads or processes) never interleave.
+    the header is written first when the file is empty.
+    """
+    if not rows:
+        return
+    os.makedirs(os.path.dirname(fname) or '.', exist_ok=True)
+    fd = os.open(fname, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        data = "\n".join(rows) + "\n"
+        if os.fstat(fd).st_size == 0:
+            data = header + "\n" + data
+        data = data.encode()
+        while data:
+            written = os.write(fd, data)
+            data = data[written:]
+    finally:
+        os.close(fd)  # also releases the lock
+
+class ResultWriter:
+    """
+    background writer for result rows: any thread queues rows and one writer thread appends them
+    in batches, when max_rows are pending or max_delay seconds after the first pending row.
+    a batch that fails to write stays pending and is retried; flush and close raise while rows are unwritten.
+    """
+    def __init__(self, max_rows: int = 64, max_delay: float = 2.0):
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.nr_rows = 0
+        self.nr_writes = 0
+        self._queue: 'queue.Queue[Tuple[str, object, object]]' = queue.Queue()
+        self._pending: Dict[str, Tuple[str, List[str]]] = {}
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='result-writer', daemon=True)
+        self._thread.start()
+
+    @property
+    def nr_unwritten(self) -> int:
+        """rows handed to the writer thread that are not on disk yet."""
+        return sum(len(rows) for _, rows in list(self._pending.values()))
+
+    def write(self, fname: str, row: str, header: str = RESULTS_HEADER):
+        self._check_open()
+        self._queue.put(('row', fname, (row, header)))
+
+    def flush(self):
+        """blocks until every row queued so far is on disk."""
+        self._check_open()
+        done = threading.Event()
+        self._queue.put(('flush', None, done))
+        while not done.wait(timeout=1.0):
+            if not self._thread.is_alive():
+                raise RuntimeError("result writer thread has stopped")
+        self._check()
+
+    def close(self):
+        """writes the pending rows and stops the writer thread; raises if some rows could not be written."""
+        self._closed = True
+        if self._thread.is_alive():
+            self._queue.put(('close', None, None))
+            self._thread.join()
+        self._check()
+
+    def __enter__(self) -> 'ResultWriter':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _check_open(self):
+        if self._closed or not self._thread.is_alive():
+            raise RuntimeError("result writer is closed")
+
+    def _check(self):
+        if self._error is not None:
+            raise RuntimeError(f"result writer failed, {self.nr_unwritten} rows are not written") from self._error
+
+    def _write_pending(self) -> bool:
+        """writes the pending batches; the ones that fail stay pending. returns True when none is left."""
+        for fname, (header, rows) in list(self._pending.items()):
+            try:
+                append_rows(fname, rows, header)
+            except OSError as e:
+                self._error = e
+                print(f"Error writing results to {fname}, {len(rows)} rows kept for retry: {e}")
+                continue
+            del self._pending[fname]
+            self.nr_rows += len(rows)
+            self.nr_writes += 1
+        if not self._pending:
+            self._error = None
+        return not self._pending
+
+    def _run(self):
+        nr_pending = 0
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            try:
+                kind, fname, item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                kind = 'timeout'
+
+            if kind == 'row':
+                row, header = item
+                self._pending.setdefault(fname, (header, []))[1].append(row)
+                nr_pending += 1
+                if deadline is None:
+                    deadline = time.monotonic() + self.max_delay
+                if nr_pending < self.max_rows:
+                    continue
+
+            nr_pending = 0
+            # failed batches are retried after another max_delay
+            deadline = None if self._write_pending() else time.monotonic() + self.max_delay
+            if kind == 'flush':
+                item.set()
+            elif kind == 'close':
+                return
+
+def result_writer_from_config(config: dict) -> ResultWriter:
+    settings = config.get('RESULT_WRITER', {})
+    return ResultWriter(settings.get('MAX_ROWS', 64), settings.get('MAX_DELAY', 2.0))
@@ -0,0 +1,193 @@
+import multiprocessing
+import traceback
+import numpy as np
+import simpy
+from typing import Dict, List, Tuple
+from .lora_config import *
+from .lora_channels import ChannelPlan, set_channel_plan, channel_plan_from_config
+from .lora_gateway import gateway_from_config
+from .lora_population import Population, PopulationSimulator, run_population_simulation
+from .lora_topology import seed_random
+
+# per-device arrays a shard sends back for its members
+SHARD_ARRAYS = ('sent', 'recv', 'coll', 'lost', 'losterror', 'noack', 'acklost', 'rxtime')
+METER_ARRAYS = ('tx_time', 'tx_charge', 'rx_time', 'idle_time')
+
+def channel_shards(plan: ChannelPlan, nr_shards: int) -> List[List[int]]:
+    """
+    splits the channels into at most nr_shards groups that never interact directly:
+    overlapping channels, and channels answered on the same RX1 downlink channel, stay together.
+    """
+    parent = list(range(plan.nr_channels))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    rx1_first: Dict[int, int] = {}
+    for i in range(plan.nr_channels):
+        for j in np.flatnonzero(plan.overlap[i]):
+            parent[find(int(j))] = find(i)
+        first = rx1_first.setdefault(plan.rx1_channels[i], i)
+        parent[find(first)] = find(i)
+
+    components: Dict[int, List[int]] = {}
+    for i in range(plan.nr_channels):
+        components.setdefault(find(i), []).append(i)
+
+    # largest components first, each into the least loaded shard
+    shards: List[List[int]] = [[] for _ in range(min(nr_shards, len(components)))]
+    for channels in sorted(components.values(), key=len, reverse=True):
+        min(shards, key=len).extend(channels)
+    return [sorted(channels) for channels in shards]
+
+def allocate_demodulators(demand: np.ndarray, total: int) -> np.ndarray:
+    """integer shares of the demodulators, proportional to demand, at least one each, summing to total."""
+    nr_shards = len(demand)
+    if demand.sum() <= 0:
+        demand = np.ones(nr_shards)
+    ideal = (total - nr_shards) * demand / demand.sum()
+    shares = np.floor(ideal).astype(np.int64)
+    remainder = (total - nr_shards) - shares.sum()
+    shares[np.argsort(shares - ideal)[:remainder]] += 1  # largest remainders first
+    return shares + 1
+
+def allocate_fractions(demand: np.ndarray, floor: float = 0.05) -> np.ndarray:
+    """fractions proportional to demand, each at least floor / nr_shards, summing to one."""
+    nr_shards = len(demand)
+    if demand.sum() <= 0:
+        return np.full(nr_shards, 1.0 / nr_shards)
+    return floor / nr_shards + (1.0 - floor) * demand / demand.sum()
+
+def _shard_main(conn, config: dict, population: Population, classes: List[int], seed: int):
+    """
+    runs the classes of one shard epoch by epoch.
+    receives ('run', until, demodulators, rx2_fraction) and answers (demod_time, rx2_requests)
+    for the epoch; on ('finish',) sends back the per-device arrays of its members.
+    """
+    try:
+        seed_random(seed)
+        env = simpy.Environment()
+        gateway = gateway_from_config(config)
+        rx2_duty_cycle = gateway.rx2_duty_cycle
+        simulator = PopulationSimulator(env, population, config['SIMULATION_PARAMS']['FULL_COLLISION_MODEL'], 1, gateway)
+        for index in classes:
+            env.process(simulator.class_process(population.classes[index]))
+
+        while True:
+            message = conn.recv()
+            if message[0] == 'finish':
+                break
+            _, until, demodulators, rx2_fraction = message
+            simulator.max_bs_receives = demodulators
+            gateway.rx2_duty_cycle = rx2_duty_cycle * rx2_fraction
+            demod_time = simulator.demod_time
+            rx2_requests = gateway.nr_rx2 + gateway.nr_missed
+            env.run(until=until)
+            conn.send(('epoch', simulator.demod_time - demod_time, gateway.nr_rx2 + gateway.nr_missed - rx2_requests))
+
+        members = np.concatenate([population.classes[i].members for i in classes]) if classes else np.empty(0, np.int64)
+        arrays = {name: getattr(population, name)[members] for name in SHARD_ARRAYS}
+        arrays.update({name: getattr(population.meter, name)[members] for name in METER_ARRAYS})
+        conn.send(('done', members, arrays))
+    except (EOFError, ConnectionError):
+        pass  # the parent has gone away or aborted the run
+    except Exception:
+        try:
+            conn.send(('error', traceback.format_exc()))
+        except OSError:
+            pass
+    finally:
+        conn.close()
+
+def run_sharded_population(config: dict, nr_nodes: int) -> Tuple[Population, float]:
+    """
+    runs the population-scale model with the channels split over shard processes.
+    shards only share the gateway: the demodulators (MAX_BS_RECEIVES) and the RX2 duty cycle.
+    each shard gets a fixed part of them for an epoch, so the global limits are never exceeded,
+    and the parts are re-balanced at every epoch barrier according to the load of the last epoch.
+    """
+    sim_params = config['SIMULATION_PARAMS']
+    exp_ctrl = config['EXPERIMENT_CONTROL']
+    settings = config.get('SHARDING', {})
+    sim_end = exp_ctrl['SIMULATION_TIME']
+    epoch = settings.get('EPOCH', 600.0)
+    max_bs_receives = exp_ctrl['MAX_BS_RECEIVES']
+
+    # the shards inherit the population and the loaded configuration by forking
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        print("Sharding needs the 'fork' start method, running the population in one process")
+        return run_population_simulation(config, nr_nodes)
+
+    plan = channel_plan_from_config(config)
+    set_channel_plan(plan)
+    population = Population(nr_nodes, sim_params['AVG_SEND_TIME'], sim_params['DATA_SIZE'])
+
+    # every shard needs at least one demodulator of its own
+    shards = channel_shards(plan, min(settings.get('SHARDS', multiprocessing.cpu_count()), max_bs_receives))
+    shard_classes = [[i for i, c in enumerate(population.classes) if c.channel in channels] for channels in shards]
+    print(f"Sharding {nr_nodes} devices over {len(shards)} processes (channels {shards})")
+
+    # start from the offered airtime of each shard
+    offered = np.array([sum(len(population.classes[i].members) * population.classes[i].rectime for i in classes)
+                        for classes in shard_classes])
+    demodulators = allocate_demodulators(offered, max_bs_receives)
+    rx2_fraction = allocate_fractions(offered)
+
+    context = multiprocessing.get_context('fork')
+    connections, processes = [], []
+    for k, classes in enumerate(shard_classes):
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(target=_shard_main,
+                                  args=(child_conn, config, population, classes, sim_params['RND_SEED'] * 1009 + k + 1))
+        process.start()
+        child_conn.close()
+        connections.append(parent_conn)
+        processes.append(process)
+
+    def send(k: int, message: tuple):
+        try:
+            connections[k].send(message)
+        except OSError:
+            raise RuntimeError(f"shard {k} exited unexpectedly (exit code {processes[k].exitcode})") from None
+
+    def receive(k: int) -> tuple:
+        try:
+            message = connections[k].recv()
+        except (EOFError, OSError):
+            raise RuntimeError(f"shard {k} exited unexpectedly (exit code {processes[k].exitcode})") from None
+        if message[0] == 'error':
+            raise RuntimeError(f"shard {k} failed:\n{message[1]}")
+        return message
+
+    completed = False
+    try:
+        now = 0.0
+        while now < sim_end:
+            now = min(now + epoch, sim_end)
+            for k in range(len(connections)):
+                send(k, ('run', now, int(demodulators[k]), float(rx2_fraction[k])))
+            loads = [receive(k)[1:] for k in range(len(connections))]
+            demodulators = allocate_demodulators(np.array([load[0] for load in loads]), max_bs_receives)
+            rx2_fraction = allocate_fractions(np.array([load[1] for load in loads], dtype=np.float64))
+
+        for k in range(len(connections)):
+            send(k, ('finish',))
+        for k in range(len(connections)):
+            _, members, arrays = receive(k)
+            for name in SHARD_ARRAYS:
+                getattr(population, name)[members] = arrays[name]
+            for name in METER_ARRAYS:
+                getattr(population.meter, name)[members] = arrays[name]
+        completed = True
+    finally:
+        # after a failure the other shards are stopped instead of being waited for
+        for conn in connections:
+            conn.close()
+        for process in processes:
+            if not completed and process.is_alive():
+                process.terminate()
+            process.join()
+    return population, sim_end
@@ -1,19 +1,31 @@
 import simpy
 import random
+import copy
 import sys
 import math
 import numpy as np
-import os
-import re
 import json
 import matplotlib.pyplot as plt
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 # import modules
 import src.lora_events as lora_events
 from .lora_config import *
-from .lora_node import myNode, assignParameters, myPacket
+from .lora_node import myNode
 from .lora_events import transmit
+from .lora_trace import TraceWriter
+from .lora_collision import arrival_batcher_from_config
+from .lora_gateway import GatewayScheduler, Downlink, ADR_PRIORITY, gateway_from_config
+from .lora_history import HistoryStore, history_from_config
+from .lora_energy import EnergyMeter
+from .lora_mobility import dynamics_from_config
+from .lora_metrics import metrics_environment, metrics_reporter_from_config
+from .lora_results import ResultWriter, RESULTS_HEADER, append_rows, format_result_row
+from .lora_channels import get_channel_plan, set_channel_plan, channel_plan_from_config
+from .lora_allocation import allocation_solver_from_config
+from .lora_population import run_population_simulation, calculate_population_stats
+from .lora_shard import run_sharded_population
+from .lora_topology import Topology, build_topology, get_topology, seed_random, topology_cache_from_config
 from .lora_events import NR_COLLISIONS, NR_RECEIVED, NR_LOST, NR_LOST_ERROR, NR_NO_ACK, NR_ACK_LOST 
 
 # global configuration holder
@@ -45,13 +57,33 @@ def reset_global_counters():
         if hasattr(lora_events, name):
             setattr(lora_events, name, 0)
 
-def network_server_process(env: simpy.Environment, nodes: List['myNode'], config: dict):
+def _apply_sf(node: 'myNode', sf: int, txpow: Optional[int] = None):
+    """applies a new SF (and TX power) on the node (the node reconfigures before its next uplink)."""
+    node.parameters.sf = sf
+    if txpow is not None:
+        node.parameters.txpow = txpow
+    node.adr_change_pending = True
+
+def network_server_process(env: simpy.Environment, nodes: List['myNode'], config: dict,
+                           gateway: Optional[GatewayScheduler] = None, history: Optional[HistoryStore] = None):
     """
     simulates the Network Server responsible for calculating and enforcing ADR++ policy.
+    with GATEWAY.DOWNLINK_ADR the new SF is sent as a LinkADRReq through the gateway
+    and only takes effect once the node receives it in one of its receive windows.
+    every decision (SF, TX power, ISR) is kept in the bounded history store when one is given.
+    with CR_ADR.POLICY "CENTRALIZED" the SF and TX power of all nodes are solved at once instead.
     """
     adr_config = config['CR_ADR']
     adr_interval = adr_config['ADR_CHECK_INTERVAL']
     efficiency_threshold = adr_config['EFFICIENCY_THRESHOLD']
+    downlink_adr = gateway is not None and config.get('GATEWAY', {}).get('DOWNLINK_ADR', False)
+
+    policy = adr_config.get('POLICY', 'ISR')
+    if policy == 'CENTRALIZED':
+        yield from _centralized_server(env, nodes, config, gateway if downlink_adr else None, history)
+        return
+    if policy != 'ISR':
+        raise ValueError(f"unknown CR_ADR.POLICY '{policy}', expected ISR or CENTRALIZED")
     
     while True:
         yield env.timeout(adr_interval)
@@ -79,15 +111,53 @@ def network_server_process(env: simpy.Environment, nodes: List['myNode'], config
                 if new_sf < 12:
                     new_sf += 1
             
+            if history is not None:
+                history.record(node.nodeid, env.now, new_sf, node.parameters.txpow, isr)
+
             if new_sf != node.parameters.sf:
-                node.parameters.sf = new_sf
-                node.adr_change_pending = True
+                if downlink_adr:
+                    gateway.enqueue(Downlink(node.nodeid, 'ADR', ADR_PRIORITY, LINK_ADR_REQ_LEN,
+                                             on_delivery=lambda node=node, sf=new_sf: _apply_sf(node, sf)))
+                else:
+                    _apply_sf(node, new_sf)
                 
             node.last_sent_count = 0
             node.last_recv_count = 0
 
-def run_simulation(config: dict, nr_nodes: int, is_modified: bool):
-    """runs a single simulation instance (Base or Modified)."""
+def _centralized_server(env: simpy.Environment, nodes: List['myNode'], config: dict,
+                        gateway: Optional[GatewayScheduler] = None, history: Optional[HistoryStore] = None):
+    """
+    network server with the CENTRALIZED policy: solves the SF and TX power of every node at start-up
+    and again every ADR_CHECK_INTERVAL (positions change with mobility and churn), and only sends
+    commands to the nodes whose assignment changed, through the gateway when one is given.
+    """
+    solver = allocation_solver_from_config(config, get_channel_plan().bandwidths)
+    while True:
+        path_loss = np.fromiter((n.path_loss for n in nodes), dtype=np.float64, count=len(nodes))
+        channel = np.fromiter((n.parameters.channel for n in nodes), dtype=np.int64, count=len(nodes))
+        sfs, txpows = solver.solve(path_loss, channel)
+
+        for node, sf, txpow in zip(nodes, sfs.tolist(), txpows.tolist()):
+            if history is not None and node.last_sent_count > 0:
+                history.record(node.nodeid, env.now, sf, txpow, node.last_recv_count / node.last_sent_count)
+            node.last_sent_count = 0
+            node.last_recv_count = 0
+
+            if sf == node.parameters.sf and txpow == node.parameters.txpow:
+                continue
+            if gateway is not None:
+                gateway.enqueue(Downlink(node.nodeid, 'ADR', ADR_PRIORITY, LINK_ADR_REQ_LEN,
+                                         on_delivery=lambda node=node, sf=sf, txpow=txpow: _apply_sf(node, sf, txpow)))
+            else:
+                _apply_sf(node, sf, txpow)
+
+        yield env.timeout(config['CR_ADR']['ADR_CHECK_INTERVAL'])
+
+def run_simulation(config: dict, nr_nodes: int, is_modified: bool, topology: Optional[Topology] = None):
+    """
+    runs a single simulation instance (Base or Modified).
+    a prebuilt topology (positions and initial SF/channel) can be passed to skip node placement.
+    """
     
     # 1. parameter extraction
     sim_params = config['SIMULATION_PARAMS']
@@ -100,51 +170,95 @@ def run_simulation(config: dict, nr_nodes: int, is_modified: bool):
     datasize = sim_params['DATA_SIZE']
     
     # 2. setup environment and geometry (correction)
-    env = simpy.Environment()
+    env = metrics_environment(config)
+    set_channel_plan(channel_plan_from_config(config))
     
-    # distance calculation (before it was missing)
-    # using constants imported from lora_config
-    min_sensi = np.amin(SENSI[:, [125, 250, 500].index(BANDWIDTH) + 1])
-    lpl = PTX - min_sensi
-    max_dist = D0 * (10**((lpl - LPLD0) / (10.0 * GAMMA)))
-    bsx = max_dist + 10
-    bsy = max_dist + 10
+    if topology is None:
+        topology = build_topology(nr_nodes)
+    elif topology.nr_nodes != nr_nodes:
+        raise ValueError(f"topology has {topology.nr_nodes} nodes, expected {nr_nodes}")
 
     packets_at_bs: List['myNode'] = []
-    nearst_ack_1p: List[float] = [0.0, 0.0, 0.0]
-    nearst_ack_10p: float = 0.0
-    nodes: List['myNode'] = []
+    gateway = gateway_from_config(config)
+    batcher = arrival_batcher_from_config(config, env, packets_at_bs)
+
+    # optional uplink trace, e.g. "results/traces/{type}_{nodes}.trace"
+    trace = None
+    if exp_ctrl.get('TRACE_FILENAME'):
+        scenario_type = 'MODIFIED' if is_modified else 'BASE'
+        trace = TraceWriter(exp_ctrl['TRACE_FILENAME'].format(type=scenario_type, nodes=nr_nodes,
+                                                              seed=sim_params['RND_SEED']),
+                            meta={'type': scenario_type, 'nodes': nr_nodes, 'seed': sim_params['RND_SEED'],
+                                  'FULL_COLLISION_MODEL': full_collision, 'MAX_BS_RECEIVES': max_bs_receives,
+                                  'CHANNEL_PLAN': config.get('CHANNEL_PLAN', {})})
 
     # 3. node creation
-    for i in range(nr_nodes):
-        node = myNode(i, 1, avg_send_time, datasize, max_dist, bsx, bsy, nodes)
-        nodes.append(node)
-        
-        node.parameters = assignParameters(node.nodeid, node.dist)
-        node.packet = myPacket(node.nodeid, node.parameters.freq, node.parameters.sf, 
-                                 node.parameters.bw, node.parameters.cr, node.parameters.txpow, 
-                                 node.dist)
-        
+    nodes: List['myNode'] = topology.make_nodes(avg_send_time, datasize)
+    meter = EnergyMeter(nr_nodes)
+    for node in nodes:
+        node.meter = meter
+    dynamics = dynamics_from_config(config, nodes, topology.max_dist, topology.bsx, topology.bsy, sim_params['RND_SEED'])
+    if dynamics is not None:
+        dynamics.start(env)
+    for node in nodes:
         if is_modified:
             # modified: event-based tx + adr++ logic
             env.process(transmit(env, node, full_collision, max_bs_receives, 
-                                 packets_at_bs, nearst_ack_1p, nearst_ack_10p,
-                                 adr_enabled=adr_config['ENABLED'], adr_check_interval=adr_config['ADR_CHECK_INTERVAL']))
+                                 packets_at_bs, gateway,
+                                 adr_enabled=adr_config['ENABLED'], adr_check_interval=adr_config['ADR_CHECK_INTERVAL'],
+                                 trace=trace, batcher=batcher))
         else:
             # base: periodic tx
             env.process(transmit(env, node, full_collision, max_bs_receives, 
-                                 packets_at_bs, nearst_ack_1p, nearst_ack_10p,
-                                 adr_enabled=False, adr_check_interval=0.0))
+                                 packets_at_bs, gateway,
+                                 adr_enabled=False, adr_check_interval=0.0, trace=trace, batcher=batcher))
             
     # 4. start network server if modified
     if is_modified and adr_config['ENABLED']:
-        env.process(network_server_process(env, nodes, config))
+        history = history_from_config(config, nr_nodes)
+        for node in nodes:
+            node.history = history
+        env.process(network_server_process(env, nodes, config, gateway, history))
 
     # 5. run simulation
-    env.run(until=exp_ctrl['SIMULATION_TIME'])
+    reporter = metrics_reporter_from_config(
+        config, env, 'MODIFIED' if is_modified else 'BASE', nr_nodes,
+        lambda: (len(packets_at_bs), sum(n.sent for n in nodes), lora_events.NR_RECEIVED))
+    try:
+        env.run(until=exp_ctrl['SIMULATION_TIME'])
+    finally:
+        if reporter is not None:
+            reporter.close('done' if env.now >= exp_ctrl['SIMULATION_TIME'] else 'failed')
+        # keep the buffered records of a failed run, they are the ones worth looking at
+        if trace is not None:
+            trace.close()
     
     return nodes, env.now
 
+def run_scenario(config: dict, nr_nodes: int, scenario_type: str, seed: int):
+    """runs one seeded Base, Modified or Population scenario and returns its statistics."""
+    config = copy.deepcopy(config)
+    config['SIMULATION_PARAMS']['RND_SEED'] = seed
+    config['SIMULATION_PARAMS']['NR_NODES'] = nr_nodes
+
+    if scenario_type == 'POPULATION':
+        seed_random(seed)
+        if config.get('SHARDING', {}).get('ENABLED', False):
+            population, sim_time = run_sharded_population(config, nr_nodes)
+        else:
+            population, sim_time = run_population_simulation(config, nr_nodes)
+        return calculate_population_stats(population, sim_time, config)
+
+    set_channel_plan(channel_plan_from_config(config))
+    topology = get_topology(nr_nodes, seed, topology_cache_from_config(config))
+
+    # reseed so cached and freshly built topologies see the same traffic
+    reset_global_counters()
+    seed_random(seed)
+    nodes, sim_time = run_simulation(config, nr_nodes, is_modified=(scenario_type == 'MODIFIED'),
+                                     topology=topology)
+    return calculate_stats(nodes, sim_time, config)
+
 def calculate_stats(nodes: List[myNode], sim_time: float, config: dict):
     """calculates and prints final statistics."""
     
@@ -156,14 +270,18 @@ def calculate_stats(nodes: List[myNode], sim_time: float, config: dict):
     nr_no_ack = lora_events.NR_NO_ACK
     nr_ack_lost = lora_events.NR_ACK_LOST
 
-    # energy calculation
-    energy = 0.0
-    for node in nodes:
-        tx_index = int(node.packet.txpow) + 2
-        tx_current = TX_MA[min(tx_index, len(TX_MA) - 1)]
-        node_tx_energy = (node.packet.rectime * node.sent * tx_current * VOLTAGE) / 1000.0
-        node_rx_energy = (node.rxtime * RX_MA * VOLTAGE) / 1000.0
-        energy += node_tx_energy + node_rx_energy
+    # energy calculation (tx, rx, idle and sleep, accumulated during the run)
+    meter = nodes[0].meter if nodes else None
+    if meter is not None:
+        energy = meter.total(sim_time)
+    else:
+        energy = 0.0
+        for node in nodes:
+            tx_index = int(node.packet.txpow) + 2
+            tx_current = TX_MA[min(tx_index, len(TX_MA) - 1)]
+            node_tx_energy = (node.packet.rectime * node.sent * tx_current * VOLTAGE) / 1000.0
+            node_rx_energy = (node.rxtime * RX_MA * VOLTAGE) / 1000.0
+            energy += node_tx_energy + node_rx_energy
         
     # fairness index
     if sent > 0:
@@ -195,38 +313,13 @@ def calculate_stats(nodes: List[myNode], sim_time: float, config: dict):
     return (sent, nr_collisions, nr_lost, nr_lost_error, nr_no_ack, nr_ack_lost, 
             sim_time, der1, der2, energy, nodefair, sf_distribution)
 
-def save_results(config, results, scenario_type="UNKNOWN", nr_nodes=0):
-    """saves results to a .dat file."""
-    
-    sim_params = config['SIMULATION_PARAMS']
-    exp_ctrl = config['EXPERIMENT_CONTROL']
-    
-    rnd_seed = sim_params['RND_SEED']
-    full_collision = sim_params['FULL_COLLISION_MODEL']
-    nodes_count = nr_nodes if nr_nodes > 0 else sim_params['NR_NODES']
-    avg_send_time = sim_params['AVG_SEND_TIME']
-    datasize = sim_params['DATA_SIZE']
-    fname = exp_ctrl['OUTPUT_FILENAME']
-    
-    (sent, nr_collisions, nr_lost, nr_lost_error, nr_no_ack, nr_ack_lost, 
-     sim_time, der1, der2, energy, nodefair, sf_distribution) = results
-    
-    sf_str = "_".join(map(str, sf_distribution))
-    
-    # add scenario_type to the results
-    res = (f"{rnd_seed}, {full_collision}, {nodes_count}, {avg_send_time}, {datasize}, {sent}, "
-           f"{nr_collisions}, {nr_lost}, {nr_lost_error}, {nr_no_ack}, {nr_ack_lost}, "
-           f"{sim_time}, {der1:.4f}, {der2:.4f}, {energy:.4f}, {nodefair:.4f}, {sf_str}, {scenario_type}")
-
-    if not os.path.isfile(fname):
-        header = "#seed, collType, nodes, rate, size, sent, coll, lost, lostErr, noAck, ackLost, time, DER1, DER2, Energy, Fair, SFs, Type\n"
-        res = header + res
+def save_results(config, results, scenario_type="UNKNOWN", nr_nodes=0, writer: Optional[ResultWriter] = None):
+    """saves results to a .dat file, through the background writer when one is given."""
+    fname = config['EXPERIMENT_CONTROL']['OUTPUT_FILENAME']
+    row = format_result_row(config, results, scenario_type, nr_nodes)
+    if writer is not None:
+        writer.write(fname, row, RESULTS_HEADER)
+        return
 
-    new_res = re.sub(r'[^\#a-zA-Z0-9 \n\.\,\"_]', '', res)
-    
-    # create directory if it doesn't exist
-    os.makedirs(os.path.dirname(fname), exist_ok=True)
-    
-    with open(fname, "a") as myfile:
-        myfile.write(new_res + "\n")
+    append_rows(fname, [row], RESULTS_HEADER)
     print(f"Results saved to {fname}")
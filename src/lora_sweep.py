@@ -0,0 +1,232 @@
+import copy
+import heapq
+import multiprocessing
+import socket
+import threading
+import time
+import traceback
+from multiprocessing.managers import BaseManager
+from typing import Dict, List, Optional, Tuple
+
+from .lora_simulator import run_scenario, save_results
+from .lora_results import ResultWriter, result_writer_from_config
+
+SCENARIO_TYPES = ('BASE', 'MODIFIED')  # 'POPULATION' can be added through SWEEP.SCENARIO_TYPES
+
+DEFAULT_SWEEP = {
+    'HOST': '127.0.0.1',
+    'PORT': 50000,
+    'AUTHKEY': 'lorawan-sweep',
+    'MAX_RETRIES': 2,
+    'LEASE_TIMEOUT': 3600.0,
+    'LOCAL_WORKERS': 0,
+}
+
+class SweepManager(BaseManager):
+    """manager serving the sweep coordinator over a local or TCP socket."""
+    pass
+
+def sweep_settings(config: dict) -> dict:
+    """returns the SWEEP section of the config merged with the defaults."""
+    settings = dict(DEFAULT_SWEEP)
+    settings.update(config.get('SWEEP', {}))
+    if 'SEEDS' not in settings:
+        settings['SEEDS'] = [config['SIMULATION_PARAMS']['RND_SEED']]
+    return settings
+
+def build_jobs(config: dict) -> List[dict]:
+    """expands NODE_SCENARIOS x scenario type x seeds into a list of jobs."""
+    settings = sweep_settings(config)
+    seeds = settings['SEEDS']
+    jobs = []
+    for nr_nodes in config['NODE_SCENARIOS']:
+        for scenario_type in settings.get('SCENARIO_TYPES', SCENARIO_TYPES):
+            for seed in seeds:
+                jobs.append({'id': len(jobs), 'nr_nodes': nr_nodes,
+                             'scenario_type': scenario_type, 'seed': seed})
+    return jobs
+
+class SweepCoordinator:
+    """
+    hands out sweep jobs to workers and collects their results.
+    jobs with the largest node counts go out first, since they dominate wall time.
+    failed or expired jobs are queued again up to max_retries times.
+    results are handed to the background writer, so reporting never waits on the disk.
+    """
+    def __init__(self, config: dict, jobs: List[dict], max_retries: int, lease_timeout: float,
+                 writer: Optional[ResultWriter] = None):
+        self.config = config
+        self.writer = writer
+        self.max_retries = max_retries
+        self.lease_timeout = lease_timeout
+
+        self._jobs: Dict[int, dict] = {job['id']: job for job in jobs}
+        self._attempts: Dict[int, int] = {job['id']: 0 for job in jobs}
+        self._pending: List[Tuple[int, int]] = []
+        self._leases: Dict[int, Tuple[str, float]] = {}
+        self.results: Dict[int, tuple] = {}
+        self.failed: Dict[int, str] = {}
+        self._saving = 0  # results being written outside the lock
+
+        self._lock = threading.Lock()
+        self.done = threading.Event()
+
+        for job in jobs:
+            self._push(job)
+        if not jobs:
+            self.done.set()
+
+    def _push(self, job: dict):
+        heapq.heappush(self._pending, (-job['nr_nodes'], job['id']))
+
+    def _requeue_expired(self, now: float):
+        expired = [job_id for job_id, (_, deadline) in self._leases.items() if deadline < now]
+        for job_id in expired:
+            worker, _ = self._leases[job_id]
+            self._fail(job_id, f"lease expired on worker {worker}")
+
+    def _fail(self, job_id: int, error: str):
+        self._leases.pop(job_id, None)
+        self._attempts[job_id] += 1
+        job = self._jobs[job_id]
+        if self._attempts[job_id] <= self.max_retries:
+            print(f"Job {job_id} ({job['nr_nodes']} nodes, {job['scenario_type']}) failed, retrying")
+            self._push(job)
+        else:
+            print(f"Job {job_id} ({job['nr_nodes']} nodes, {job['scenario_type']}) failed permanently")
+            self.failed[job_id] = error
+            self._check_done()
+
+    def _check_done(self):
+        if self._saving == 0 and len(self.results) + len(self.failed) == len(self._jobs):
+            self.done.set()
+
+    def get_config(self) -> dict:
+        return self.config
+
+    def get_job(self, worker: str) -> Optional[dict]:
+        """
+        returns the next job for a worker.
+        None means the sweep is finished, an empty dict means the worker should poll again.
+        """
+        with self._lock:
+            now = time.time()
+            self._requeue_expired(now)
+            if self.done.is_set():
+                return None
+            while self._pending:
+                _, job_id = heapq.heappop(self._pending)
+                # a late result may have arrived for a job that was queued again after its lease expired
+                if job_id in self.results or job_id in self.failed:
+                    continue
+                self._leases[job_id] = (worker, now + self.lease_timeout)
+                return dict(self._jobs[job_id], attempt=self._attempts[job_id])
+            return {}
+
+    def report_result(self, job_id: int, stats: tuple):
+        with self._lock:
+            if job_id in self.results or job_id in self.failed:
+                return
+            self._leases.pop(job_id, None)
+            job = self._jobs[job_id]
+            self.results[job_id] = stats
+            self._saving += 1
+
+        # outside the lock, so a slow write never holds up get_job
+        try:
+            config = copy.deepcopy(self.config)
+            config['SIMULATION_PARAMS']['RND_SEED'] = job['seed']
+            save_results(config, stats, scenario_type=job['scenario_type'], nr_nodes=job['nr_nodes'],
+                         writer=self.writer)
+        finally:
+            with self._lock:
+                self._saving -= 1
+                self._check_done()
+
+    def report_failure(self, job_id: int, error: str):
+        with self._lock:
+            if job_id in self._leases:
+                self._fail(job_id, error)
+
+    def progress(self) -> Tuple[int, int, int]:
+        """returns (finished, failed, total) job counts."""
+        with self._lock:
+            return len(self.results), len(self.failed), len(self._jobs)
+
+def serve_sweep(config: dict, host: Optional[str] = None, port: Optional[int] = None,
+                local_workers: Optional[int] = None) -> SweepCoordinator:
+    """
+    serves the sweep jobs to any number of workers and blocks until all jobs are done.
+    bind host to 0.0.0.0 so that workers on other hosts can connect.
+    """
+    settings = sweep_settings(config)
+    address = (host or settings['HOST'], port or settings['PORT'])
+    authkey = settings['AUTHKEY'].encode()
+    nr_local = settings['LOCAL_WORKERS'] if local_workers is None else local_workers
+
+    jobs = build_jobs(config)
+    writer = result_writer_from_config(config)
+    coordinator = SweepCoordinator(config, jobs, settings['MAX_RETRIES'], settings['LEASE_TIMEOUT'], writer)
+
+    try:
+        SweepManager.register('coordinator', callable=lambda: coordinator)
+        manager = SweepManager(address=address, authkey=authkey)
+        server = manager.get_server()
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        print(f"--- SWEEP SERVER on {address[0]}:{address[1]} ({len(jobs)} jobs) ---")
+
+        # local workers connect through the loopback interface
+        connect_host = '127.0.0.1' if address[0] in ('0.0.0.0', '') else address[0]
+        workers = []
+        for i in range(nr_local):
+            worker = multiprocessing.Process(target=run_worker, args=((connect_host, address[1]), authkey),
+                                             kwargs={'worker_name': f"local-{i}"})
+            worker.start()
+            workers.append(worker)
+
+        while not coordinator.done.wait(timeout=5.0):
+            finished, failed, total = coordinator.progress()
+            print(f"Sweep progress: {finished}/{total} done, {failed} failed")
+
+        for worker in workers:
+            worker.join()
+        server.stop_event.set()
+    finally:
+        writer.close()
+
+    finished, failed, total = coordinator.progress()
+    print(f"\n--- SWEEP COMPLETED: {finished}/{total} done, {failed} failed ---")
+    return coordinator
+
+def run_worker(address: Tuple[str, int], authkey: bytes, worker_name: Optional[str] = None,
+               poll_interval: float = 1.0):
+    """pulls jobs from a sweep server until it reports that the sweep is finished."""
+    worker_name = worker_name or f"{socket.gethostname()}-{multiprocessing.current_process().pid}"
+
+    SweepManager.register('coordinator')
+    manager = SweepManager(address=address, authkey=authkey)
+    manager.connect()
+    coordinator = manager.coordinator()
+    config = coordinator.get_config()
+
+    while True:
+        try:
+            job = coordinator.get_job(worker_name)
+        except (EOFError, ConnectionError):
+            # the server shuts down once every job is finished
+            break
+
+        if job is None:
+            break
+        if not job:
+            time.sleep(poll_interval)
+            continue
+
+        print(f"[{worker_name}] job {job['id']}: {job['nr_nodes']} nodes, {job['scenario_type']}, seed {job['seed']}")
+        try:
+            stats = run_scenario(config, job['nr_nodes'], job['scenario_type'], job['seed'])
+        except Exception:
+            coordinator.report_failure(job['id'], traceback.format_exc())
+            continue
+        coordinator.report_result(job['id'], stats)
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import numpy as np
+from typing import List, Optional, Tuple
+from .lora_config import *
+from .lora_node import myNode, assignParameters, myPacket
+from .lora_channels import get_channel_plan
+
+# bump when the placement/assignment logic changes so old cache entries are evicted
+TOPOLOGY_CACHE_VERSION = 2
+TOPOLOGY_ARRAYS = ('x', 'y', 'dist', 'sf', 'channel')
+
+def seed_random(seed: int):
+    """seeds both the python and numpy random generators."""
+    random.seed(seed)
+    np.random.seed(seed)
+
+def network_geometry() -> Tuple[float, float, float]:
+    """returns (max_dist, bsx, bsy): the cell radius from the link budget and the BS position."""
+    min_sensi = np.amin(SENSI[:, [125, 250, 500].index(BANDWIDTH) + 1])
+    lpl = PTX - min_sensi
+    max_dist = D0 * (10**((lpl - LPLD0) / (10.0 * GAMMA)))
+    bsx = max_dist + 10
+    bsy = max_dist + 10
+    return max_dist, bsx, bsy
+
+class Topology:
+    """
+    node positions and initial radio parameters for one seed and node count.
+    everything here is independent of the SIMULATION_PARAMS/CR_ADR settings, so one
+    topology can be shared between all parameter points of a sweep.
+    """
+    def __init__(self, max_dist: float, bsx: float, bsy: float, x: np.ndarray, y: np.ndarray,
+                 dist: np.ndarray, sf: np.ndarray, channel: np.ndarray):
+        self.max_dist = max_dist
+        self.bsx = bsx
+        self.bsy = bsy
+        self.x = x
+        self.y = y
+        self.dist = dist
+        self.sf = sf
+        self.channel = channel  # index in the channel plan the topology was built with
+
+    @property
+    def nr_nodes(self) -> int:
+        return len(self.x)
+
+    def make_nodes(self, period: float, datasize: float) -> List[myNode]:
+        """creates fresh nodes (with packets) at the stored positions and initial parameters."""
+        nodes: List[myNode] = []
+        for i in range(self.nr_nodes):
+            node = myNode(i, 1, period, datasize, self.max_dist, self.bsx, self.bsy, nodes,
+                          position=(float(self.x[i]), float(self.y[i])))
+            nodes.append(node)
+
+            node.parameters = assignParameters(node.nodeid, node.dist, sf=int(self.sf[i]), channel=int(self.channel[i]))
+            node.packet = myPacket(node.nodeid, node.parameters.freq, node.parameters.sf,
+                                   node.parameters.bw, node.parameters.cr, node.parameters.txpow,
+                                   node.dist, node.parameters.channel)
+        return nodes
+
+def build_topology(nr_nodes: int) -> Topology:
+    """places nr_nodes nodes and assigns their initial SF and channel (uses the global RNGs and the active channel plan)."""
+    max_dist, bsx, bsy = network_geometry()
+
+    nodes: List[myNode] = []
+    sf = np.empty(nr_nodes, dtype=np.int8)
+    channel = np.empty(nr_nodes, dtype=np.uint8)
+    for i in range(nr_nodes):
+        node = myNode(i, 1, 0.0, 0.0, max_dist, bsx, bsy, nodes)
+        nodes.append(node)
+
+        parameters = assignParameters(node.nodeid, node.dist)
+        sf[i] = parameters.sf
+        channel[i] = parameters.channel
+
+    x = np.array([n.x for n in nodes], dtype=np.float64)
+    y = np.array([n.y for n in nodes], dtype=np.float64)
+    dist = np.array([n.dist for n in nodes], dtype=np.float64)
+    return Topology(max_dist, bsx, bsy, x, y, dist, sf, channel)
+
+def topology_key(nr_nodes: int, seed: int) -> str:
+    """hashes everything the placement and initial SF/channel assignment depend on."""
+    max_dist, _, _ = network_geometry()
+    h = hashlib.sha256()
+    h.update(repr((TOPOLOGY_CACHE_VERSION, nr_nodes, seed, max_dist, BANDWIDTH, CODING_RATE,
+                   LORAWAN_HEADER, list(PCKT_LENGTH_SF), TX_POWER, PTX, GAMMA, D0, LPLD0, GL,
+                   get_channel_plan().fingerprint())).encode())
+    h.update(SENSI.tobytes())
+    return h.hexdigest()[:32]
+
+class TopologyCache:
+    """
+    on-disk cache of topologies, one directory of .npy arrays per key.
+    entries are loaded memory-mapped (zero-copy, shared by all processes through the page cache),
+    written atomically so parallel runs can share the directory, and evicted least-recently-used.
+    """
+    def __init__(self, directory: str, max_entries: int = 64, max_age: Optional[float] = None):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_age = max_age
+
+    def _entry(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def load(self, key: str) -> Optional[Topology]:
+        path = self._entry(key)
+        try:
+            with open(os.path.join(path, 'meta.json'), 'r') as f:
+                meta = json.load(f)
+            arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in TOPOLOGY_ARRAYS}
+        except (FileNotFoundError, ValueError):
+            return None
+        if meta.get('version') != TOPOLOGY_CACHE_VERSION:
+            return None
+
+        # mark as recently used for the eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return Topology(meta['max_dist'], meta['bsx'], meta['bsy'], **arrays)
+
+    def store(self, key: str, topology: Topology):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix='.tmp-', dir=self.directory)
+        try:
+            for name in TOPOLOGY_ARRAYS:
+                np.save(os.path.join(tmp, f"{name}.npy"), np.asarray(getattr(topology, name)))
+            meta = {'version': TOPOLOGY_CACHE_VERSION, 'max_dist': topology.max_dist,
+                    'bsx': topology.bsx, 'bsy': topology.bsy}
+            with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            # the rename publishes the entry atomically; if another process won the race keep its copy
+            os.rename(tmp, self._entry(key))
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def evict(self):
+        """removes stale, outdated and least-recently-used entries beyond max_entries."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        now = time.time()
+        entries = []
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                mtime = os.stat(path).st_mtime
+            except FileNotFoundError:
+                continue
+            if name.startswith('.tmp-'):
+                # leftovers of writers that died mid-store
+                if now - mtime > 3600.0:
+                    shutil.rmtree(path, ignore_errors=True)
+                continue
+            if self.max_age is not None and now - mtime > self.max_age:
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            try:
+                with open(os.path.join(path, 'meta.json'), 'r') as f:
+                    outdated = json.load(f).get('version') != TOPOLOGY_CACHE_VERSION
+            except (FileNotFoundError, ValueError):
+                outdated = True
+            if outdated:
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            entries.append((mtime, path))
+
+        entries.sort(reverse=True)
+        for _, path in entries[self.max_entries:]:
+            shutil.rmtree(path, ignore_errors=True)
+
+def topology_cache_from_config(config: dict) -> Optional[TopologyCache]:
+    """returns the cache described by the TOPOLOGY_CACHE section, or None if disabled."""
+    settings = config.get('TOPOLOGY_CACHE', {})
+    if not settings.get('ENABLED', False):
+        return None
+    return TopologyCache(settings['DIRECTORY'], settings.get('MAX_ENTRIES', 64), settings.get('MAX_AGE'))
+
+def get_topology(nr_nodes: int, seed: int, cache: Optional[TopologyCache] = None) -> Topology:
+    """returns the topology for a seed and node count, from the cache when possible."""
+    key = topology_key(nr_nodes, seed) if cache is not None else None
+    if cache is not None:
+        topology = cache.load(key)
+        if topology is not None:
+            return topology
+
+    seed_random(seed)
+    topology = build_topology(nr_nodes)
+    if cache is not None:
+        cache.store(key, topology)
+    return topology
@@ -0,0 +1,193 @@
+import heapq
+import json
+import math
+import os
+import numpy as np
+from typing import Dict, Optional, Tuple
+from .lora_config import *
+from .lora_collision import check_collision
+from .lora_gateway import GatewayScheduler
+from .lora_channels import set_channel_plan, channel_plan_from_config
+
+TRACE_MAGIC = b'LORATRC1'
+
+# one record per uplink, written when its reception ends
+TRACE_DTYPE = np.dtype([
+    ('nodeid', '<u4'),
+    ('start', '<f8'),
+    ('rectime', '<f8'),
+    ('sf', 'u1'),
+    ('channel', 'u1'),
+    ('bw', '<u2'),
+    ('rssi', '<f8'),
+    ('path_loss', '<f4'),
+    ('dl_rssi', '<f4'),  # NaN when no downlink was drawn
+    ('outcome', 'u1'),
+])
+
+# outcomes, in the order transmit() classifies them
+OUTCOME_RECEIVED = 0
+OUTCOME_LOST = 1
+OUTCOME_LOST_ERROR = 2
+OUTCOME_COLLIDED = 3
+OUTCOME_NO_ACK = 4
+OUTCOME_ACK_LOST = 5
+OUTCOME_NAMES = ('received', 'lost', 'lost_error', 'collided', 'no_ack', 'ack_lost')
+
+def packet_outcome(packet) -> int:
+    """classifies a finished uplink like the statistics in transmit()."""
+    if packet.lost:
+        return OUTCOME_LOST
+    elif packet.perror:
+        return OUTCOME_LOST_ERROR
+    elif packet.collided == 1:
+        return OUTCOME_COLLIDED
+    elif packet.acked == 0:
+        return OUTCOME_NO_ACK
+    elif packet.acklost == 1:
+        return OUTCOME_ACK_LOST
+    return OUTCOME_RECEIVED
+
+class TraceWriter:
+    """compact binary uplink trace, buffered in a preallocated array and written in bulk."""
+    def __init__(self, fname: str, buffer_size: int = 65536, meta: Optional[dict] = None):
+        os.makedirs(os.path.dirname(fname) or '.', exist_ok=True)
+        self.fname = fname
+        self._f = open(fname, 'wb')
+        header = json.dumps({'dtype': TRACE_DTYPE.descr, 'meta': meta or {}}).encode()
+        self._f.write(TRACE_MAGIC + len(header).to_bytes(4, 'little') + header)
+        self._buf = np.empty(buffer_size, dtype=TRACE_DTYPE)
+        self._n = 0
+
+    def record(self, packet, path_loss: float, dl_rssi: float, outcome: int):
+        self._buf[self._n] = (packet.nodeid, packet.addTime, packet.rectime, packet.sf,
+                              packet.channel, packet.bw,
+                              packet.rssi, path_loss, dl_rssi, outcome)
+        self._n += 1
+        if self._n == len(self._buf):
+            self.flush()
+
+    def flush(self):
+        if self._n:
+            self._buf[:self._n].tofile(self._f)
+            self._n = 0
+        self._f.flush()
+
+    def close(self):
+        self.flush()
+        self._f.close()
+
+def read_trace(fname: str) -> Tuple[np.ndarray, dict]:
+    """returns the trace records (memory-mapped) and the metadata stored with them."""
+    with open(fname, 'rb') as f:
+        if f.read(len(TRACE_MAGIC)) != TRACE_MAGIC:
+            raise ValueError(f"{fname} is not an uplink trace")
+        header_len = int.from_bytes(f.read(4), 'little')
+        header = json.loads(f.read(header_len))
+    offset = len(TRACE_MAGIC) + 4 + header_len
+    if os.path.getsize(fname) == offset:
+        return np.empty(0, dtype=TRACE_DTYPE), header['meta']
+    records = np.memmap(fname, dtype=TRACE_DTYPE, mode='r', offset=offset)
+    return records, header['meta']
+
+class _Clock:
+    __slots__ = ('now',)
+
+    def __init__(self):
+        self.now = 0.0
+
+class _ReplayPacket:
+    """a traced uplink that acts as its own 'node' for the collision and ack checks."""
+    __slots__ = ('index', 'nodeid', 'channel', 'sf', 'bw', 'cr', 'rectime', 'rssi', 'addTime',
+                 'collided', 'processed', 'env', 'rxtime')
+
+    def __init__(self, index: int, record, clock: _Clock):
+        self.index = index
+        self.nodeid = int(record['nodeid'])
+        self.channel = int(record['channel'])
+        self.sf = int(record['sf'])
+        self.bw = int(record['bw'])
+        self.cr = CODING_RATE
+        self.rectime = float(record['rectime'])
+        self.rssi = float(record['rssi'])
+        self.addTime = float(record['start'])
+        self.collided = 0
+        self.processed = 0
+        self.env = clock
+        self.rxtime = 0.0
+
+    @property
+    def packet(self) -> '_ReplayPacket':
+        return self
+
+def replay_trace(fname: str, full_collision: int, max_bs_receives: int,
+                 gateway: Optional[GatewayScheduler] = None, seed: int = 0) -> Dict[str, object]:
+    """
+    re-evaluates only the collision and ack logic over a recorded trace.
+    link loss and packet errors are taken from the trace; downlink shadowing is reused when it was
+    recorded and drawn from a generator seeded with seed otherwise.
+    the traffic is replayed as recorded: retransmissions are not re-decided and MAC commands
+    queued by the network server are not replayed.
+    the channel indices are resolved with the channel plan stored in the trace.
+    """
+    records, meta = read_trace(fname)
+    plan = channel_plan_from_config({'CHANNEL_PLAN': meta.get('CHANNEL_PLAN', {})})
+    set_channel_plan(plan)
+    if gateway is None:
+        gateway = GatewayScheduler(plan)
+    elif len(gateway.rx1_channels) != plan.nr_channels:
+        raise ValueError(f"the gateway and the channel plan of {fname} have different channel counts")
+    rng = np.random.default_rng(seed)
+    clock = _Clock()
+
+    order = np.argsort(records['start'], kind='stable')
+    outcomes = np.empty(len(records), dtype=np.uint8)
+    packets_at_bs = []
+    ends = []  # heap of (end time, order, packet)
+
+    def finish(packet: _ReplayPacket):
+        clock.now = packet.addTime + packet.rectime
+        packets_at_bs.remove(packet)
+        if packet.collided == 1:
+            outcomes[packet.index] = OUTCOME_COLLIDED
+            return
+        window, frame = gateway.schedule(packet, clock.now, packet)
+        if window == 0:
+            outcomes[packet.index] = OUTCOME_NO_ACK
+            return
+        record = records[packet.index]
+        dl_rssi = float(record['dl_rssi'])
+        if math.isnan(dl_rssi):
+            dl_rssi = TX_POWER - float(record['path_loss'])
+            if VAR > 0: dl_rssi -= rng.normal(0, VAR)
+        sensitivity = SENSI[packet.sf - 7, [125, 250, 500].index(packet.bw) + 1]
+        outcomes[packet.index] = OUTCOME_ACK_LOST if dl_rssi < sensitivity else OUTCOME_RECEIVED
+
+    for i in order:
+        record = records[i]
+        start = float(record['start'])
+        while ends and ends[0][0] <= start:
+            finish(heapq.heappop(ends)[2])
+
+        recorded = int(record['outcome'])
+        if recorded in (OUTCOME_LOST, OUTCOME_LOST_ERROR):
+            outcomes[i] = recorded
+            continue
+
+        clock.now = start
+        packet = _ReplayPacket(int(i), record, clock)
+        if check_collision(packet, packets_at_bs, max_bs_receives, full_collision) == 1:
+            packet.collided = 1
+        packets_at_bs.append(packet)
+        heapq.heappush(ends, (start + packet.rectime, int(i), packet))
+
+    while ends:
+        finish(heapq.heappop(ends)[2])
+
+    sent = len(records)
+    counts = {name: int(np.count_nonzero(outcomes == code)) for code, name in enumerate(OUTCOME_NAMES)}
+    results: Dict[str, object] = {'sent': sent, **counts}
+    results['der'] = counts['received'] / float(sent) if sent else 0
+    results['changed'] = int(np.count_nonzero(outcomes != records['outcome'])) if sent else 0
+    results['meta'] = meta
+    return results
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the simulator is imported as the src package from the repository root, as main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+from src.lora_capacity import CapacityEstimator
+
+@pytest.fixture(scope='module')
+def estimator():
+    return CapacityEstimator(300.0, max_bs_receives=8, nr_channels=3, grid_points=50,
+                             sim_time=100000.0, data_size=32, payload=20)
+
+def test_uplinks_follow_the_buffer_and_retransmissions(estimator):
+    assert estimator.data_uplinks == 2
+    # every uplink acked: one per payload; none acked: the first is tried 9 times, the last once
+    assert np.allclose(estimator._uplinks(np.ones(50) - estimator.p_dropped), 2.0)
+    assert np.allclose(estimator._uplinks(np.zeros(50))[estimator.p_dropped < 1e-9], 10.0)
+
+def test_more_devices_lower_der(estimator):
+    der = estimator.estimate([10, 500, 2000])['der']
+    assert 0.0 < der[2] < der[1] < der[0] <= 1.0
+
+def test_interesting_marks_both_sides_of_large_der_steps(estimator, monkeypatch):
+    der = np.array([0.50, 0.49, 0.45, 0.44, 0.43])
+    monkeypatch.setattr(estimator, 'estimate', lambda node_counts: {'der': der})
+    counts = np.array([100, 200, 300, 400, 500])
+    assert estimator.interesting(counts, min_change=0.02).tolist() == [200, 300]
+    assert estimator.interesting(counts, min_change=0.5).tolist() == []
@@ -0,0 +1,48 @@
+import copy
+import random
+from types import SimpleNamespace
+import pytest
+from src.lora_channels import legacy_plan, eu868_plan, us915_plan, set_channel_plan
+from src.lora_collision import check_collision, resolve_batch
+
+class FakeNode:
+    """the parts of myNode the collision checks read."""
+    def __init__(self, packet):
+        self.packet = packet
+        self.env = SimpleNamespace(now=packet.addTime)
+
+def random_node(rng: random.Random, plan, add_time: float, processed: int) -> FakeNode:
+    channel = rng.randrange(plan.nr_channels)
+    return FakeNode(SimpleNamespace(nodeid=rng.randrange(20), channel=channel, sf=rng.randint(7, 12),
+                                    bw=plan.bandwidths[channel], rssi=float(rng.randint(-135, -90)),  # integers hit the thresholds exactly
+                                    addTime=add_time, rectime=rng.uniform(0.02, 1.5),
+                                    processed=processed, collided=0))
+
+def outcome(nodes):
+    return [(n.packet.collided, n.packet.processed) for n in nodes]
+
+@pytest.mark.parametrize('plan', [legacy_plan(), eu868_plan(), us915_plan()], ids=lambda plan: plan.name)
+@pytest.mark.parametrize('full_collision', [0, 1, 2])
+def test_resolve_batch_matches_sequential_checks(plan, full_collision):
+    set_channel_plan(plan)
+    rng = random.Random(full_collision * 1000 + plan.nr_channels)
+    try:
+        for _ in range(500):
+            at_bs = [random_node(rng, plan, -rng.uniform(0.0, 1.5), rng.randint(0, 1))
+                     for _ in range(rng.randint(0, 6))]
+            times = sorted(rng.uniform(0.0, 0.01) for _ in range(rng.randint(1, 12)))
+            arrivals = [random_node(rng, plan, t, 0) for t in times]
+            max_bs_receives = rng.randint(1, 8)
+
+            sequential_bs, sequential_arrivals = copy.deepcopy((at_bs, arrivals))
+            for node in sequential_arrivals:
+                if check_collision(node.packet, sequential_bs, max_bs_receives, full_collision,
+                                   env_now=node.packet.addTime) == 1:
+                    node.packet.collided = 1
+                sequential_bs.append(node)
+
+            batch_bs = list(at_bs)
+            resolve_batch(arrivals, batch_bs, max_bs_receives, full_collision)
+            assert outcome(batch_bs) == outcome(sequential_bs)
+    finally:
+        set_channel_plan(legacy_plan())
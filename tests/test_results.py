@@ -0,0 +1,77 @@
+import multiprocessing
+import os
+import threading
+import pytest
+from src.lora_results import ResultWriter, append_rows
+
+HEADER = "#header"
+
+def _append_from_process(fname: str, worker: int, nr_batches: int):
+    for batch in range(nr_batches):
+        append_rows(fname, [f"p{worker} b{batch} r{i} " + "x" * 200 for i in range(5)], HEADER)
+
+def _check_file(fname: str, expected: set):
+    with open(fname) as f:
+        lines = f.read().splitlines()
+    assert lines[0] == HEADER
+    assert lines.count(HEADER) == 1
+    assert sorted(lines[1:]) == sorted(expected)  # every row once, none torn
+
+def test_concurrent_processes_and_threads_do_not_lose_or_interleave_rows(tmp_path):
+    fname = str(tmp_path / "results.dat")
+    processes = [multiprocessing.Process(target=_append_from_process, args=(fname, w, 20)) for w in range(4)]
+    for process in processes:
+        process.start()
+
+    rows = set()
+    with ResultWriter(max_rows=7, max_delay=0.05) as writer:
+        def produce(thread: int):
+            for i in range(200):
+                writer.write(fname, f"t{thread} r{i} " + "y" * 100, HEADER)
+        threads = [threading.Thread(target=produce, args=(t,)) for t in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    rows.update(f"t{t} r{i} " + "y" * 100 for t in range(4) for i in range(200))
+    rows.update(f"p{w} b{b} r{i} " + "x" * 200 for w in range(4) for b in range(20) for i in range(5))
+    assert writer.nr_rows == 800
+    _check_file(fname, rows)
+
+def test_failed_batch_is_kept_and_retried(tmp_path):
+    fname = str(tmp_path / "results.dat")
+    os.mkdir(fname)  # appending fails while a directory is in the way
+
+    writer = ResultWriter(max_rows=2, max_delay=0.05)
+    writer.write(fname, "a", HEADER)
+    writer.write(fname, "b", HEADER)
+    with pytest.raises(RuntimeError):
+        writer.flush()
+    assert writer.nr_unwritten == 2
+
+    os.rmdir(fname)
+    writer.flush()
+    writer.close()
+    assert writer.nr_unwritten == 0
+    _check_file(fname, {"a", "b"})
+
+def test_close_raises_while_rows_are_unwritten(tmp_path):
+    fname = str(tmp_path / "results.dat")
+    os.mkdir(fname)
+    writer = ResultWriter(max_rows=10, max_delay=10.0)
+    writer.write(fname, "a", HEADER)
+    with pytest.raises(RuntimeError):
+        writer.close()
+    assert writer.nr_unwritten == 1
+
+def test_write_and_flush_raise_after_close(tmp_path):
+    writer = ResultWriter()
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.write(str(tmp_path / "results.dat"), "a", HEADER)
+    with pytest.raises(RuntimeError):
+        writer.flush()
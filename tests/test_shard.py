@@ -0,0 +1,71 @@
+import json
+import multiprocessing
+import os
+import numpy as np
+import pytest
+import src.lora_shard as lora_shard
+from src.lora_channels import legacy_plan, eu868_plan, us915_plan
+from src.lora_shard import allocate_demodulators, allocate_fractions, channel_shards, run_sharded_population
+from src.lora_topology import seed_random
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'config.json')
+
+@pytest.mark.parametrize('total', [3, 8, 17])
+def test_demodulator_shares_sum_to_total_with_one_each(total):
+    rng = np.random.default_rng(total)
+    demands = [np.zeros(3), np.array([1.0, 0.0, 0.0]), np.array([1e-9, 5.0, 1e6])]
+    demands += [rng.random(3) * rng.integers(0, 2, 3) for _ in range(50)]
+    for demand in demands:
+        shares = allocate_demodulators(demand, total)
+        assert shares.dtype.kind == 'i'
+        assert shares.sum() == total
+        assert shares.min() >= 1
+
+def test_demodulator_shares_follow_demand():
+    shares = allocate_demodulators(np.array([6.0, 2.0, 0.0]), 11)
+    assert list(shares) == [7, 3, 1]
+
+def test_rx2_fractions_sum_to_one_with_a_floor():
+    for demand in (np.zeros(4), np.array([0.0, 0.0, 3.0, 1.0]), np.array([1.0, 1.0, 1.0, 1.0])):
+        fractions = allocate_fractions(demand, floor=0.05)
+        assert fractions.sum() == pytest.approx(1.0)
+        assert fractions.min() >= 0.05 / 4 - 1e-12
+
+@pytest.mark.parametrize('plan, nr_shards, expected', [(legacy_plan(), 3, 3), (eu868_plan(), 3, 3),
+                                                        (eu868_plan(), 16, 8), (us915_plan(), 4, 1)])
+def test_channel_shards_partition_the_plan(plan, nr_shards, expected):
+    shards = channel_shards(plan, nr_shards)
+    assert len(shards) == expected
+    assert sorted(c for shard in shards for c in shard) == list(range(plan.nr_channels))
+    for shard in shards:
+        others = [c for other in shards if other is not shard for c in other]
+        assert not plan.overlap[np.ix_(shard, others)].any()
+
+def small_config() -> dict:
+    with open(CONFIG_FILE) as f:
+        config = json.load(f)
+    config['EXPERIMENT_CONTROL']['SIMULATION_TIME'] = 5000.0
+    config['SHARDING'] = {'ENABLED': True, 'SHARDS': 3, 'EPOCH': 1000.0}
+    config['METRICS'] = {'ENABLED': False}
+    return config
+
+def test_sharded_run_fills_every_device():
+    seed_random(1)
+    population, sim_time = run_sharded_population(small_config(), 600)
+    assert sim_time == 5000.0
+    assert population.sent.sum() > 0
+    assert (population.recv <= population.sent).all()
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason="shards need fork")
+def test_dead_shard_raises_instead_of_hanging(monkeypatch):
+    shard_main = lora_shard._shard_main
+
+    def dying_shard(conn, config, population, classes, seed):
+        if seed % 1009 == 2:
+            os._exit(1)  # dies without reporting, like an OOM kill
+        shard_main(conn, config, population, classes, seed)
+
+    monkeypatch.setattr(lora_shard, '_shard_main', dying_shard)
+    seed_random(1)
+    with pytest.raises(RuntimeError, match='shard 1 exited unexpectedly'):
+        run_sharded_population(small_config(), 600)
@@ -0,0 +1,72 @@
+import time
+import pytest
+import src.lora_sweep as lora_sweep
+from src.lora_sweep import SweepCoordinator
+
+LEASE = 0.05
+
+@pytest.fixture
+def saved(monkeypatch):
+    rows = []
+    monkeypatch.setattr(lora_sweep, 'save_results',
+                        lambda config, stats, scenario_type, nr_nodes, writer=None: rows.append((nr_nodes, stats)))
+    return rows
+
+def make_coordinator(nr_jobs: int = 2, max_retries: int = 2) -> SweepCoordinator:
+    config = {'SIMULATION_PARAMS': {'RND_SEED': 0}}
+    jobs = [{'id': i, 'nr_nodes': 100 * (nr_jobs - i), 'seed': 1, 'scenario_type': 'BASE'} for i in range(nr_jobs)]
+    return SweepCoordinator(config, jobs, max_retries, LEASE)
+
+def test_largest_jobs_go_out_first(saved):
+    coordinator = make_coordinator(3)
+    assert [coordinator.get_job('w')['nr_nodes'] for _ in range(3)] == [300, 200, 100]
+    assert coordinator.get_job('w') == {}
+
+def test_expired_lease_is_queued_again(saved):
+    coordinator = make_coordinator(1)
+    job = coordinator.get_job('slow')
+    assert coordinator.get_job('other') == {}
+    time.sleep(2 * LEASE)
+    retry = coordinator.get_job('other')
+    assert retry['id'] == job['id'] and retry['attempt'] == 1
+
+    coordinator.report_result(job['id'], 'stats')
+    assert coordinator.done.is_set()
+    assert coordinator.get_job('other') is None
+    assert saved == [(100, 'stats')]
+
+def test_late_result_is_not_recomputed(saved):
+    coordinator = make_coordinator(2)
+    job = coordinator.get_job('slow')
+    time.sleep(2 * LEASE)
+    other = coordinator.get_job('fast')  # expires the lease of the slow worker and requeues its job
+    assert other['id'] == job['id']
+    coordinator.report_result(job['id'], 'late')
+    coordinator.report_result(job['id'], 'duplicate')
+
+    remaining = coordinator.get_job('fast')
+    assert remaining['id'] != job['id']
+    coordinator.report_result(remaining['id'], 'stats')
+    assert coordinator.get_job('fast') is None
+    assert sorted(saved) == [(100, 'stats'), (200, 'late')]
+
+def test_requeued_job_skipped_once_result_arrives(saved):
+    coordinator = make_coordinator(2)
+    job = coordinator.get_job('slow')
+    time.sleep(2 * LEASE)
+    with coordinator._lock:
+        coordinator._requeue_expired(time.time())
+    coordinator.report_result(job['id'], 'late')
+
+    remaining = coordinator.get_job('other')
+    assert remaining['id'] != job['id']
+    assert coordinator.get_job('other') == {}  # the requeued copy is not handed out again
+
+def test_job_fails_after_max_retries(saved):
+    coordinator = make_coordinator(1, max_retries=1)
+    for attempt in range(2):
+        job = coordinator.get_job('w')
+        assert job['attempt'] == attempt
+        coordinator.report_failure(job['id'], 'boom')
+    assert coordinator.failed == {job['id']: 'boom'}
+    assert coordinator.get_job('w') is None